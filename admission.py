@@ -0,0 +1,154 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from fastapi import HTTPException
+from datetime import datetime
+import itertools
+import logging
+import threading
+import time
+import metrics
+
+# ----------------------------------------------------------------------
+# Admission control, per worker process.
+#
+# Heavy admin work (player generation, auto team assignment, bulk import)
+# runs through a Limiter: a few requests at a time, a short bounded queue
+# behind them, and anything beyond that, or still queued after the timeout,
+# is rejected with 503 and a Retry-After hint instead of piling up on the
+# threadpool. Oversized generation requests become background jobs that run
+# in chunks and are polled through /jobs/{job_id}. Live games are capped per
+# worker; spectators joining a running game are always admitted.
+
+logger = logging.getLogger(__name__)
+
+MAX_LIVE_GAMES = 200
+RETRY_AFTER_SECONDS = 5
+
+HEAVY_JOB_LIMIT = 2
+HEAVY_JOB_QUEUE = 8
+HEAVY_JOB_QUEUE_TIMEOUT = 10
+
+# Generation requests above the inline limit run as background jobs.
+GENERATE_INLINE_LIMIT = 1000
+GENERATE_MAX_PLAYERS = 1000000
+GENERATE_CHUNK_SIZE = 1000
+
+BACKGROUND_WORKERS = 1
+MAX_PENDING_JOBS = 4
+FINISHED_JOBS_KEPT = 100
+
+ADMISSION_REJECTED = metrics.Counter(
+    "qg2_admission_rejected_total", "Requests turned away by admission control, by limiter.", ("limiter",))
+ADMISSION_WAIT_SECONDS = metrics.Histogram(
+    "qg2_admission_wait_seconds", "Time spent queued for an admission slot, by limiter.", ("limiter",))
+ADMISSION_IN_USE = metrics.Gauge(
+    "qg2_admission_in_use", "Admission slots currently held, by limiter.", ("limiter",))
+
+_jobs_lock = threading.Lock()
+_jobs = OrderedDict()
+_job_ids = itertools.count(1)
+_executor = None
+
+# ----------------------------------------------------------------------
+
+def saturated(detail: str, retry_after: int = RETRY_AFTER_SECONDS) -> HTTPException:
+    return HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(retry_after)})
+
+class Limiter:
+    def __init__(self, name: str, limit: int, queue_limit: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def admit(self):
+        start = time.perf_counter()
+        with self._condition:
+            if self.active >= self.limit:
+                if self.waiting >= self.queue_limit:
+                    ADMISSION_REJECTED.inc(1, self.name)
+                    raise saturated(f"Too many {self.name} requests in progress, try again later")
+                self.waiting += 1
+                try:
+                    admitted = self._condition.wait_for(lambda: self.active < self.limit, timeout=self.timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    ADMISSION_REJECTED.inc(1, self.name)
+                    raise saturated(f"Timed out waiting for a {self.name} slot, try again later")
+            self.active += 1
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, self.name)
+        ADMISSION_IN_USE.inc(1, self.name)
+        try:
+            yield
+        finally:
+            ADMISSION_IN_USE.dec(1, self.name)
+            with self._condition:
+                self.active -= 1
+                self._condition.notify()
+
+HEAVY_JOBS = Limiter("heavy_jobs", HEAVY_JOB_LIMIT, HEAVY_JOB_QUEUE, HEAVY_JOB_QUEUE_TIMEOUT)
+
+def check_live_game_capacity(running: int):
+    if running >= MAX_LIVE_GAMES:
+        ADMISSION_REJECTED.inc(1, "live_games")
+        raise saturated("Too many live games on this server, try again later")
+
+# ----------------------------------------------------------------------
+# Background jobs
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="qg2-job")
+    return _executor
+
+def _update_job(job_id: int, **changes):
+    with _jobs_lock:
+        _jobs[job_id].update(changes)
+
+def _run_job(job_id: int, func, args: tuple):
+    _update_job(job_id, status="running", started_at=datetime.utcnow().isoformat())
+
+    def progress(done: int):
+        _update_job(job_id, done=done)
+
+    try:
+        func(*args, progress=progress)
+        _update_job(job_id, status="done", finished_at=datetime.utcnow().isoformat())
+    except Exception as e:
+        logger.exception("Job %s failed: %s", job_id, e)
+        _update_job(job_id, status="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+
+def submit_job(kind: str, total: int, func, *args) -> dict:
+    # `func(*args, progress=callback)` runs on the background worker and
+    # reports how many of `total` units are done as it goes.
+    with _jobs_lock:
+        pending = sum(1 for job in _jobs.values() if job["status"] in ("queued", "running"))
+        if pending >= MAX_PENDING_JOBS:
+            ADMISSION_REJECTED.inc(1, "background_jobs")
+            raise saturated("Too many background jobs queued, try again later", RETRY_AFTER_SECONDS * 6)
+        job_id = next(_job_ids)
+        job = _jobs[job_id] = {
+            "id": job_id, "kind": kind, "status": "queued", "total": total, "done": 0,
+            "created_at": datetime.utcnow().isoformat(), "started_at": None, "finished_at": None, "error": None,
+        }
+        finished = [key for key, value in _jobs.items() if value["status"] in ("done", "failed")]
+        for key in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del _jobs[key]
+        snapshot = dict(job)
+    _get_executor().submit(_run_job, job_id, func, args)
+    return snapshot
+
+def get_job(job_id: int) -> dict:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            # Jobs are tracked by the worker that accepted them.
+            raise HTTPException(status_code=404, detail="Job not found")
+        return dict(job)
@@ -1,21 +1,20 @@
 from fastapi import Request, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from models import User as DBUser
-from passlib.context import CryptContext
 from typing import Optional
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
 from fastapi.security import OAuth2PasswordBearer
 from database import get_db
 import logging
 
 # ----------------------------------------------------------------------
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# passlib and jose are imported on first use to keep worker boot fast.
+_pwd_context = None
 
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
@@ -23,11 +22,18 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 # ----------------------------------------------------------------------
 
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
 def hash_password(password: str):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def authenticate_user(db, username: str, password: str):
     user = db.query(DBUser).filter(DBUser.username == username).first()
@@ -45,6 +51,7 @@ async def get_token(request: Request):
     return None
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -63,6 +70,7 @@ def gen_access_token(user):
     return access_token
 
 def get_user_auth(db: Session, token: str = Depends(oauth2_scheme)):
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -0,0 +1,358 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from models import Base, User as DBUser, Player as DBPlayer, League as DBLeague, Team as DBTeam, Game as DBGame
+from gameplay import (
+    starter_depth_thresholds, get_team_lineup, handle_player_movement, handle_snitch_catch,
+    handle_snitch_placement, handle_game_tick, start_game_simulation
+)
+from gen_players import generate_players
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# ----------------------------------------------------------------------
+# Usage:
+#   python benchmark.py --output bench_results.json
+#   python benchmark.py --output bench_results.json --save-baseline bench_baseline.json
+#   python benchmark.py --output bench_results.json --baseline bench_baseline.json
+
+DEFAULT_THRESHOLD = 1.25
+
+# A websocket client that waits longer than this for a frame gives up and
+# counts as failed.
+FRAME_TIMEOUT_SECONDS = 30
+
+# ----------------------------------------------------------------------
+
+def seed_database(db: Session, leagues: int, teams_per_league: int, players_per_team: int, free_agents: int):
+    owner = DBUser(username="bench", hashed_password="", role="admin")
+    db.add(owner)
+    db.commit()
+
+    team_ids = []
+    for league_index in range(leagues):
+        league = DBLeague(name=f"league_{league_index + 1}")
+        db.add(league)
+        db.commit()
+        for team_index in range(teams_per_league):
+            team = DBTeam(name=f"team_{league_index + 1}_{team_index + 1}", owner_id=owner.id, league_id=league.id)
+            db.add(team)
+            db.commit()
+            team_ids.append(team.id)
+
+    # Every team gets a full set of starters before any depth players.
+    positions = []
+    for position, count in starter_depth_thresholds.items():
+        positions += [position] * count
+    roster_size = max(players_per_team, len(positions))
+    for team_id in team_ids:
+        depths = {position: 0 for position in starter_depth_thresholds}
+        players = generate_players(roster_size, db)
+        for index, player in enumerate(players):
+            position = positions[index] if index < len(positions) else player.primary_position
+            depths[position] += 1
+            player.team_id = team_id
+            player.current_position = position
+            player.depth = depths[position]
+    db.commit()
+
+    if free_agents:
+        generate_players(free_agents, db)
+
+    return team_ids
+
+def create_game(db: Session, home_team_id: int, away_team_id: int, seed: int = None) -> int:
+    game = DBGame(season_id=1, home_team_id=home_team_id, away_team_id=away_team_id, status="scheduled", seed=seed)
+    db.add(game)
+    db.commit()
+    return game.id
+
+# ----------------------------------------------------------------------
+
+def summarize(samples: list, operations: int = None) -> dict:
+    ordered = sorted(samples)
+    total = sum(ordered)
+    operations = operations if operations is not None else len(ordered)
+    return {
+        "iterations": len(ordered),
+        "total_seconds": total,
+        "throughput_per_second": operations / total if total else None,
+        "mean_ms": statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+    }
+
+def percentile(ordered: list, pct: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def time_call(func, iterations: int, warmup: int = 1, setup=None) -> list:
+    # `setup` runs untimed before every call.
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+# ----------------------------------------------------------------------
+# Benchmarks
+
+def bench_generate_players(SessionLocal, args) -> dict:
+    def run():
+        db = SessionLocal()
+        try:
+            generate_players(args.generate_batch, db)
+        finally:
+            db.close()
+    samples = time_call(run, args.iterations)
+    return summarize(samples, operations=len(samples) * args.generate_batch)
+
+def bench_team_lineup(SessionLocal, args, team_ids: list) -> dict:
+    db = SessionLocal()
+    try:
+        return summarize(time_call(lambda: get_team_lineup(db, random.choice(team_ids), "starters"), args.iterations))
+    finally:
+        db.close()
+
+def bench_player_movement(SessionLocal, args, game_id: int, team_id: int) -> dict:
+    db = SessionLocal()
+    try:
+        samples = time_call(lambda: handle_player_movement(db, team_id, game_id), args.iterations)
+        db.rollback()
+        return summarize(samples)
+    finally:
+        db.close()
+
+def bench_snitch_catch(SessionLocal, args, game_id: int) -> dict:
+    db = SessionLocal()
+    try:
+        handle_snitch_placement(db, game_id)
+        return summarize(time_call(lambda: handle_snitch_catch(db, game_id), args.iterations))
+    finally:
+        db.close()
+
+def bench_full_game(SessionLocal, args, team_ids: list) -> dict:
+    samples = []
+    for game_index in range(args.games):
+        db = SessionLocal()
+        try:
+            # Seeded games replay the same draws on every run.
+            game_id = create_game(db, team_ids[0], team_ids[1], seed=args.seed + game_index)
+            start = time.perf_counter()
+            start_game_simulation(db, game_id)
+            for order in range(1, args.ticks + 1):
+                handle_game_tick(db, game_id, order)
+            samples.append(time.perf_counter() - start)
+        finally:
+            db.close()
+    result = summarize(samples)
+    result["ticks_per_second"] = (args.games * args.ticks) / sum(samples)
+    return result
+
+def bench_players_endpoint(client, args, cached: bool = False) -> dict:
+    # Uncached, every request runs the query and serialization; cached, all
+    # but the warmup are served from the response cache.
+    import cache
+
+    def run():
+        response = client.get("/players")
+        response.raise_for_status()
+    return summarize(time_call(run, args.iterations, setup=None if cached else cache.clear))
+
+def receive_frame(websocket, timeout: float) -> dict:
+    # The test client's receive_text has no timeout, so wait on its stream
+    # from the client's own event loop instead.
+    import anyio
+
+    async def receive():
+        with anyio.fail_after(timeout):
+            return await websocket._send_rx.receive()
+
+    message = websocket.portal.call(receive)
+    websocket._raise_on_close(message)
+    return json.loads(message["text"])
+
+def bench_websocket_games(client, args, first_game_id: int) -> dict:
+    from fastapi import WebSocketDisconnect
+
+    def run_client(game_id: int) -> dict:
+        frame_gaps = []
+        frames = 0
+        error = None
+        start = time.perf_counter()
+        try:
+            with client.websocket_connect(f"/game/{game_id}") as websocket:
+                websocket.send_text(json.dumps({"type": "start_game"}))
+                receive_frame(websocket, FRAME_TIMEOUT_SECONDS)
+                last_frame = time.perf_counter()
+                while True:
+                    message = receive_frame(websocket, FRAME_TIMEOUT_SECONDS)
+                    now = time.perf_counter()
+                    if message.get("type") == "game_over":
+                        break
+                    if message.get("type") == "game_error":
+                        error = f"game_error: {message.get('message')}"
+                        break
+                    frame_gaps.append(now - last_frame)
+                    last_frame = now
+                    frames += 1
+        except WebSocketDisconnect as e:
+            error = f"disconnected ({e.code})"
+        except TimeoutError:
+            error = f"no frame for {FRAME_TIMEOUT_SECONDS}s"
+        return {"elapsed": time.perf_counter() - start, "frames": frames, "frame_gaps": frame_gaps,
+                "error": f"game {game_id}: {error}" if error else None}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(run_client, range(first_game_id, first_game_id + args.clients)))
+    wall = time.perf_counter() - start
+
+    frame_gaps = [gap for result in results for gap in result["frame_gaps"]]
+    frames = sum(result["frames"] for result in results)
+    summary = summarize(frame_gaps)
+    summary["clients"] = args.clients
+    summary["errors"] = [result["error"] for result in results if result["error"]]
+    summary["wall_seconds"] = wall
+    summary["throughput_per_second"] = frames / wall if wall else None
+    return summary
+
+# ----------------------------------------------------------------------
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous or not previous.get("p50_ms"):
+            continue
+        ratio = result["p50_ms"] / previous["p50_ms"]
+        result["baseline_p50_ms"] = previous["p50_ms"]
+        result["p50_ratio"] = ratio
+        if ratio > threshold:
+            regressions.append(f"{name}: p50 {result['p50_ms']:.3f}ms vs baseline {previous['p50_ms']:.3f}ms ({ratio:.2f}x)")
+    return regressions
+
+def run_benchmarks(args) -> dict:
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix="qg2-bench-")
+    db_path = os.path.join(workdir, "bench.db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = SessionLocal()
+    try:
+        team_ids = seed_database(db, args.leagues, args.teams, args.players, args.free_agents)
+        game_id = create_game(db, team_ids[0], team_ids[1])
+    finally:
+        db.close()
+
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "save_baseline")},
+        "python": sys.version.split()[0],
+        "benchmarks": {}
+    }
+    benchmarks = results["benchmarks"]
+
+    # The HTTP and websocket paths run against the same throwaway database
+    # through dependency overrides, so the real qg2.db is never touched.
+    from fastapi.testclient import TestClient
+    import cache
+    import database
+    import live_games
+    import main
+
+    def get_bench_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    main.app.dependency_overrides[database.get_db] = get_bench_db
+    live_games.GAME_TICK_DELAY = 0
+    live_games.session_factory = SessionLocal
+    cache.engine = engine
+    client = TestClient(main.app)
+
+    try:
+        # /players runs before any movement has written float positions back to the rows.
+        benchmarks["players_endpoint"] = bench_players_endpoint(client, args)
+        benchmarks["players_endpoint_cached"] = bench_players_endpoint(client, args, cached=True)
+        benchmarks["get_team_lineup"] = bench_team_lineup(SessionLocal, args, team_ids)
+        benchmarks["handle_player_movement"] = bench_player_movement(SessionLocal, args, game_id, team_ids[0])
+        benchmarks["handle_snitch_catch"] = bench_snitch_catch(SessionLocal, args, game_id)
+        benchmarks["generate_players"] = bench_generate_players(SessionLocal, args)
+        benchmarks["full_game"] = bench_full_game(SessionLocal, args, team_ids)
+        if args.clients:
+            benchmarks["websocket_games"] = bench_websocket_games(client, args, first_game_id=game_id + 100000)
+    finally:
+        main.app.dependency_overrides.pop(database.get_db, None)
+        live_games.session_factory = database.SessionLocal
+        cache.engine = database.engine
+        engine.dispose()
+        os.remove(db_path)
+        os.rmdir(workdir)
+
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark gameplay and API hot paths against a throwaway SQLite database.")
+    parser.add_argument("--leagues", type=int, default=1)
+    parser.add_argument("--teams", type=int, default=4, help="Teams per league")
+    parser.add_argument("--players", type=int, default=14, help="Players per team")
+    parser.add_argument("--free-agents", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--generate-batch", type=int, default=50)
+    parser.add_argument("--games", type=int, default=5)
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent synthetic websocket clients")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Compare against a previously saved result file")
+    parser.add_argument("--save-baseline", help="Also write the results to this baseline file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed p50 slowdown ratio")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.teams < 2:
+        raise SystemExit("At least two teams per league are required")
+    results = run_benchmarks(args)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        results["regressions"] = regressions
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+
+    for name, result in results["benchmarks"].items():
+        print(f"{name:<24} p50 {result['p50_ms']:9.3f}ms  p99 {result['p99_ms']:9.3f}ms  {result['throughput_per_second'] or 0:10.1f}/s")
+    errors = [f"{name}: {error}" for name, result in results["benchmarks"].items() for error in result.get("errors", [])]
+    for error in errors:
+        print(f"ERROR {error}")
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions or errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
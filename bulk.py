@@ -0,0 +1,305 @@
+from fastapi import HTTPException
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import Player as DBPlayer, Team as DBTeam, League as DBLeague
+from schemas import PlayerImport, TeamImport, LeagueImport
+from serializers import encode_json, schema_columns
+from typing import List
+from typing_extensions import NotRequired, TypedDict
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+# ----------------------------------------------------------------------
+# Usage:
+#   python bulk.py export players --format csv --output players.csv
+#   python bulk.py import players players.ndjson
+#
+# Streaming bulk import and export of players, teams and leagues as CSV,
+# NDJSON or (with pyarrow installed) Parquet. Both directions work in chunks,
+# so memory stays flat however many rows move:
+#   - export selects plain column tuples with yield_per and encodes each
+#     partition as it arrives;
+#   - import reads rows lazily, validates a chunk at a time against the
+#     entity's schema and inserts it with one executemany, committing per
+#     chunk. A bad row, or a chunk that clashes with existing ids or unique
+#     names (409), stops the import; earlier chunks stay committed and the
+#     error says how many rows made it in.
+# Rows keep their ids when the file has them, so related tables can be
+# migrated between environments (leagues, then teams, then players).
+
+IMPORT_CHUNK_SIZE = 5000
+EXPORT_CHUNK_SIZE = 5000
+
+FORMATS = ("csv", "ndjson", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+ENTITIES = {
+    "players": (DBPlayer, PlayerImport),
+    "teams": (DBTeam, TeamImport),
+    "leagues": (DBLeague, LeagueImport),
+}
+
+# Cached responses an import can change, invalidated after every import
+# (HTTP or CLI) whether or not it got through every chunk.
+IMPORT_CACHE_NAMESPACES = ("players", "teams", "standings")
+
+_row_validators = {}
+
+# ----------------------------------------------------------------------
+
+def get_entity(name: str) -> tuple:
+    entity = ENTITIES.get(name)
+    if entity is None:
+        raise HTTPException(status_code=404, detail=f"Unknown entity. Choose one of: {', '.join(ENTITIES)}")
+    return entity
+
+def check_format(data_format: str) -> str:
+    if data_format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Choose one of: {', '.join(FORMATS)}")
+    if data_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=400, detail="Parquet support needs pyarrow installed")
+    return data_format
+
+def format_from_filename(filename: str, default: str = "csv") -> str:
+    extension = os.path.splitext(filename or "")[1].lstrip(".").lower()
+    return {"jsonl": "ndjson", "json": "ndjson", "pq": "parquet"}.get(extension, extension) if extension else default
+
+def row_validator(schema) -> tuple:
+    # Validates against the schema's fields as a TypedDict, which skips
+    # building a model per row (about 3x faster on large loads). Returns
+    # (adapter, fields, defaults) so rows can be turned into insert tuples.
+    validator = _row_validators.get(schema)
+    if validator is None:
+        fields = {}
+        defaults = []
+        for name, field in schema.model_fields.items():
+            if field.is_required():
+                fields[name] = field.annotation
+            else:
+                fields[name] = NotRequired[field.annotation]
+            defaults.append((name, field.get_default()))
+        row_type = TypedDict(f"{schema.__name__}Row", fields)
+        validator = _row_validators[schema] = (TypeAdapter(List[row_type]), tuple(defaults))
+    return validator
+
+def insert_sql(model, fields: tuple) -> str:
+    columns = ", ".join(f'"{field}"' for field in fields)
+    return f"INSERT INTO {model.__tablename__} ({columns}) VALUES ({', '.join('?' * len(fields))})"
+
+# ----------------------------------------------------------------------
+# Export
+
+class _ChunkSink:
+    # Write-only file for pyarrow that hands back whatever was written since
+    # the last drain, while reporting the true offset the footer needs.
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def iter_partitions(db: Session, schema, model):
+    fields, columns = schema_columns(schema, model)
+    result = db.execute(select(*columns).order_by(model.id).execution_options(yield_per=EXPORT_CHUNK_SIZE))
+    for partition in result.partitions():
+        yield fields, partition
+
+def export_csv(db: Session, schema, model):
+    fields = tuple(schema.model_fields)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for _, rows in iter_partitions(db, schema, model):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def export_ndjson(db: Session, schema, model):
+    for fields, rows in iter_partitions(db, schema, model):
+        yield b"".join(encode_json(dict(zip(fields, row))) + b"\n" for row in rows)
+
+def export_parquet(db: Session, schema, model):
+    import pyarrow
+    import pyarrow.parquet as parquet
+
+    sink = _ChunkSink()
+    writer = None
+    for fields, rows in iter_partitions(db, schema, model):
+        table = pyarrow.Table.from_pylist([dict(zip(fields, row)) for row in rows])
+        if writer is None:
+            writer = parquet.ParquetWriter(pyarrow.PythonFile(sink, mode="w"), table.schema)
+        writer.write_table(table.cast(writer.schema))
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+EXPORTERS = {"csv": export_csv, "ndjson": export_ndjson, "parquet": export_parquet}
+
+def export_rows(db: Session, entity: str, data_format: str):
+    # Generator of encoded chunks; the caller owns the session.
+    model, schema = get_entity(entity)
+    return EXPORTERS[check_format(data_format)](db, schema, model)
+
+# ----------------------------------------------------------------------
+# Import
+
+def read_csv(stream):
+    reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+    header = next(reader, [])
+    for row in reader:
+        # Empty cells are missing values, not empty strings.
+        yield {key: value for key, value in zip(header, row) if value != ""}
+
+def read_ndjson(stream):
+    for line in io.TextIOWrapper(stream, encoding="utf-8"):
+        if line.strip():
+            yield json.loads(line)
+
+def read_parquet(stream):
+    import pyarrow.parquet as parquet
+    for batch in parquet.ParquetFile(stream).iter_batches(batch_size=IMPORT_CHUNK_SIZE):
+        yield from batch.to_pylist()
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson, "parquet": read_parquet}
+
+def iter_chunks(rows, size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def import_rows(db: Session, entity: str, data_format: str, stream, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    # `stream` is a binary file object. Returns counts; raises a 422 on the
+    # first invalid chunk and a 409 on the first conflicting one.
+    model, schema = get_entity(entity)
+    adapter, defaults = row_validator(schema)
+    # Plain DBAPI executemany over tuples; the ORM and Core parameter
+    # handling cost more per row than SQLite itself.
+    statement = insert_sql(model, tuple(name for name, _ in defaults))
+    imported = 0
+    chunks = 0
+    start = time.perf_counter()
+    try:
+        for chunk in iter_chunks(READERS[check_format(data_format)](stream), chunk_size):
+            try:
+                validated = adapter.validate_python(chunk)
+            except ValidationError as e:
+                error = e.errors()[0]
+                row, *location = error["loc"]
+                raise HTTPException(status_code=422, detail={
+                    "message": f"Row {imported + row + 1}: {'.'.join(map(str, location))} {error['msg']}",
+                    "rows_imported": imported,
+                })
+            # A NULL id makes SQLite assign the next rowid.
+            try:
+                db.connection().exec_driver_sql(statement, [
+                    tuple(row.get(name, default) for name, default in defaults) for row in validated
+                ])
+            except IntegrityError as e:
+                # The whole chunk is rolled back; earlier chunks stay committed.
+                raise HTTPException(status_code=409, detail={
+                    "message": f"Rows {imported + 1}-{imported + len(validated)} conflict with existing data: {e.orig}",
+                    "rows_imported": imported,
+                })
+            db.commit()
+            imported += len(validated)
+            chunks += 1
+    except (ValueError, csv.Error, UnicodeDecodeError) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail={"message": f"Unreadable {data_format}: {e}", "rows_imported": imported})
+    except HTTPException:
+        db.rollback()
+        raise
+    return {"entity": entity, "rows_imported": imported, "chunks": chunks, "seconds": time.perf_counter() - start}
+
+# ----------------------------------------------------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import and export of players, teams and leagues.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Stream a table to a file")
+    export.add_argument("entity", choices=ENTITIES)
+    export.add_argument("--format", choices=FORMATS, help="Defaults to the output file's extension, else csv")
+    export.add_argument("--output", help="Output file; stdout when omitted")
+    load = subparsers.add_parser("import", help="Load a file into a table")
+    load.add_argument("entity", choices=ENTITIES)
+    load.add_argument("path")
+    load.add_argument("--format", choices=FORMATS, help="Defaults to the file's extension")
+    load.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    import database
+    database.create_db_and_tables()
+    db = database.SessionLocal()
+    try:
+        if args.command == "export":
+            data_format = args.format or format_from_filename(args.output)
+            output = open(args.output, "wb") if args.output else sys.stdout.buffer
+            try:
+                for chunk in export_rows(db, args.entity, data_format):
+                    output.write(chunk)
+            finally:
+                if args.output:
+                    output.close()
+        else:
+            import cache
+            try:
+                with open(args.path, "rb") as f:
+                    result = import_rows(db, args.entity, args.format or format_from_filename(args.path), f, args.chunk_size)
+            finally:
+                cache.invalidate(*IMPORT_CACHE_NAMESPACES)
+            print(f"imported {result['rows_imported']} {args.entity} in {result['chunks']} chunks "
+                  f"({result['seconds']:.2f}s)")
+    except HTTPException as e:
+        print(f"error: {e.detail}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+from collections import OrderedDict
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+from models import CacheVersion as DBCacheVersion
+import hashlib
+import logging
+import threading
+import time
+import database
+import metrics
+
+# ----------------------------------------------------------------------
+# Server-side cache of pre-serialized JSON responses for read-heavy routes.
+#
+# Entries are keyed by route path, query string and the current version of
+# every namespace the response depends on ("players", "teams"). Writes bump a
+# namespace version through `invalidate`, which makes older entries
+# unreachable and drops them.
+#
+# Each worker keeps its own entries, but versions are also bumped in the
+# cache_versions table, and every worker re-reads that table at most every
+# SHARED_VERSIONS_POLL_SECONDS. A write on one worker or node therefore
+# reaches the others within that interval, and at once on the worker that
+# made it.
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+CACHE_MAX_ENTRIES = 1024
+SHARED_VERSIONS_POLL_SECONDS = 1.0
+
+# Engine holding the shared versions. Swapped out by benchmarks.
+engine = database.engine
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_versions = {}
+_shared_versions = {}
+_shared_read_at = float("-inf")
+_total_bytes = 0
+
+CACHE_REQUESTS = metrics.Counter(
+    "qg2_response_cache_requests_total", "Response cache lookups, by result.", ("result",))
+CACHE_BYTES = metrics.Gauge(
+    "qg2_response_cache_bytes", "Bytes held in the response cache.")
+
+# ----------------------------------------------------------------------
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+def _evict(key):
+    global _total_bytes
+    entry = _entries.pop(key, None)
+    if entry is not None:
+        _total_bytes -= len(entry["body"])
+
+def _store(key, namespaces: tuple, body: bytes, etag: str):
+    global _total_bytes
+    if len(body) > CACHE_MAX_BYTES:
+        return
+    with _lock:
+        _evict(key)
+        _entries[key] = {"body": body, "etag": etag, "namespaces": namespaces}
+        _total_bytes += len(body)
+        while _entries and (_total_bytes > CACHE_MAX_BYTES or len(_entries) > CACHE_MAX_ENTRIES):
+            _evict(next(iter(_entries)))
+        CACHE_BYTES.set(_total_bytes)
+
+def _lookup(key):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+        return entry
+
+def _drop_namespaces(namespaces):
+    # Caller holds _lock.
+    stale = [key for key, entry in _entries.items() if set(entry["namespaces"]) & set(namespaces)]
+    for key in stale:
+        _evict(key)
+    CACHE_BYTES.set(_total_bytes)
+
+def invalidate(*namespaces: str):
+    with _lock:
+        for namespace in namespaces:
+            _versions[namespace] = _versions.get(namespace, 0) + 1
+        _drop_namespaces(namespaces)
+    try:
+        with engine.begin() as conn:
+            for namespace in namespaces:
+                conn.execute(insert(DBCacheVersion).values(namespace=namespace, version=1).on_conflict_do_update(
+                    index_elements=["namespace"], set_={"version": DBCacheVersion.version + 1}
+                ))
+    except SQLAlchemyError as e:
+        # This worker is already up to date; the others catch up on their
+        # next successful invalidation of the namespace.
+        logger.warning("Could not publish cache invalidation of %s: %s", ", ".join(namespaces), e)
+
+def shared_versions() -> dict:
+    # Namespace versions bumped by any worker, re-read at most once per poll
+    # interval. Entries of namespaces that moved on are dropped.
+    global _shared_versions, _shared_read_at
+    now = time.monotonic()
+    if now - _shared_read_at < SHARED_VERSIONS_POLL_SECONDS:
+        return _shared_versions
+    try:
+        with engine.connect() as conn:
+            versions = dict(conn.execute(select(DBCacheVersion.namespace, DBCacheVersion.version)).all())
+    except SQLAlchemyError as e:
+        logger.warning("Could not read shared cache versions: %s", e)
+        versions = _shared_versions
+    with _lock:
+        changed = [namespace for namespace, version in versions.items() if _shared_versions.get(namespace) != version]
+        if changed:
+            _drop_namespaces(changed)
+        _shared_versions = versions
+        _shared_read_at = now
+    return versions
+
+def clear():
+    global _total_bytes
+    with _lock:
+        _entries.clear()
+        _total_bytes = 0
+        CACHE_BYTES.set(0)
+
+def cache_key(request: Request, namespaces: tuple) -> tuple:
+    shared = shared_versions()
+    with _lock:
+        versions = tuple((_versions.get(namespace, 0), shared.get(namespace, 0)) for namespace in namespaces)
+    query = tuple(sorted(request.query_params.multi_items()))
+    return (request.url.path, query, versions)
+
+def _json_response(request: Request, body: bytes, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def cached_response(request: Request, namespaces: tuple, build) -> Response:
+    # `build` returns the serialized JSON body and only runs on a miss.
+    key = cache_key(request, namespaces)
+    entry = _lookup(key)
+    if entry is not None:
+        CACHE_REQUESTS.inc(1, "hit")
+        return _json_response(request, entry["body"], entry["etag"])
+
+    CACHE_REQUESTS.inc(1, "miss")
+    body = build()
+    etag = make_etag(body)
+    _store(key, namespaces, body, etag)
+    return _json_response(request, body, etag)
@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+# ----------------------------------------------------------------------
+# Usage:
+#   python cluster_check.py
+#   python cluster_check.py --base-port 8101 --lease-seconds 3
+#
+# Starts two app processes ("a" and "b") against one throwaway SQLite
+# database and checks the game ownership story end to end:
+#   1. a spectator on node a starts a game, so a holds its lease;
+#   2. a spectator on node b joins the same game and is relayed a's frames,
+#      and keeps receiving them after sending b another message;
+#   3. node a is killed mid-game; once its lease expires node b takes the
+#      game over from the last snapshot, the spectator resumes on b without
+#      being sent frames it already had, and the game finishes with exactly
+#      one interval log per tick.
+
+GAME_ID = 1
+
+# ----------------------------------------------------------------------
+
+def seed(db_url: str):
+    os.environ["QG2_DATABASE_URL"] = db_url
+    import database
+    from models import Game as DBGame
+    from benchmark import seed_database
+
+    database.create_db_and_tables()
+    db = database.SessionLocal()
+    try:
+        team_ids = seed_database(db, leagues=1, teams_per_league=2, players_per_team=7, free_agents=0)
+        db.add(DBGame(id=GAME_ID, season_id=1, home_team_id=team_ids[0], away_team_id=team_ids[1], status="scheduled"))
+        db.commit()
+    finally:
+        db.close()
+
+def start_node(name: str, port: int, db_url: str, args) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        QG2_DATABASE_URL=db_url,
+        QG2_NODE_ID=name,
+        QG2_NODE_URL=f"ws://127.0.0.1:{port}",
+        QG2_LEASE_SECONDS=str(args.lease_seconds),
+        QG2_HEARTBEAT_SECONDS=str(args.lease_seconds / 3),
+        QG2_LOG_LEVEL="WARNING",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env
+    )
+
+async def wait_for_node(port: int, timeout: float = 20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"Node on port {port} did not start")
+
+async def watch(url: str, message: dict, frames: list, stop_after: int = None, followup: dict = None):
+    # Collects (type, seq) until game over, the connection closes, or
+    # `stop_after` state updates have arrived. `followup` is sent after the
+    # first frame.
+    import websockets
+
+    async with websockets.connect(f"{url}/game/{GAME_ID}") as websocket:
+        await websocket.send(json.dumps(message))
+        try:
+            while True:
+                data = json.loads(await asyncio.wait_for(websocket.recv(), timeout=60))
+                frames.append((data.get("type"), data.get("seq")))
+                if followup is not None and len(frames) == 1:
+                    await websocket.send(json.dumps(followup))
+                if data.get("type") in ("game_over", "game_error"):
+                    return
+                updates = sum(1 for frame_type, _ in frames if frame_type == "game_state_update")
+                if stop_after is not None and updates >= stop_after:
+                    return
+        except websockets.ConnectionClosed:
+            return
+
+async def run_check(args, db_url: str) -> list:
+    failures = []
+    url_a = f"ws://127.0.0.1:{args.base_port}"
+    url_b = f"ws://127.0.0.1:{args.base_port + 1}"
+    node_a = start_node("a", args.base_port, db_url, args)
+    node_b = start_node("b", args.base_port + 1, db_url, args)
+    try:
+        await wait_for_node(args.base_port)
+        await wait_for_node(args.base_port + 1)
+
+        owner_frames = []
+        relayed_frames = []
+        owner = asyncio.create_task(watch(url_a, {"type": "start_game"}, owner_frames, stop_after=2))
+        await asyncio.sleep(0.5)
+        relayed = asyncio.create_task(watch(url_b, {"type": "start_game"}, relayed_frames, stop_after=2,
+                                            followup={"type": "ping"}))
+        await asyncio.gather(owner, relayed)
+        print(f"owner a sent {owner_frames}")
+        print(f"relay b sent {relayed_frames}")
+        if sum(1 for frame_type, _ in relayed_frames if frame_type == "game_state_update") < 2:
+            failures.append("node b did not relay node a's frames through the client's second message")
+
+        last_seq = max((seq for frame_type, seq in relayed_frames if seq is not None), default=0)
+        node_a.send_signal(signal.SIGKILL)
+        node_a.wait()
+        print(f"killed node a after seq {last_seq}")
+
+        resumed_frames = []
+        deadline = time.monotonic() + args.lease_seconds * 4 + 10
+        while time.monotonic() < deadline:
+            resumed_frames.clear()
+            await watch(url_b, {"type": "resume", "last_seq": last_seq}, resumed_frames)
+            if resumed_frames and resumed_frames[-1][0] == "game_over":
+                break
+            await asyncio.sleep(1)
+        print(f"after takeover b sent {resumed_frames}")
+        if not resumed_frames or resumed_frames[-1][0] != "game_over":
+            failures.append("node b never finished the game after node a died")
+        repeated = [seq for frame_type, seq in resumed_frames if frame_type == "game_state_update" and seq <= last_seq]
+        if repeated:
+            failures.append(f"node b resent frames {repeated} the client had acknowledged with last_seq {last_seq}")
+    finally:
+        for node in (node_a, node_b):
+            if node.poll() is None:
+                node.terminate()
+                node.wait()
+    return failures
+
+def check_database(db_url: str) -> list:
+    from models import Game as DBGame, GameIntervalLog as DBGIL, GameLease as DBGameLease
+    import database
+
+    failures = []
+    db = database.SessionLocal()
+    try:
+        game = db.query(DBGame).filter(DBGame.id == GAME_ID).first()
+        orders = [order for (order,) in db.query(DBGIL.order).filter(DBGIL.game_id == GAME_ID).order_by(DBGIL.order)]
+        lease = db.query(DBGameLease).filter(DBGameLease.game_id == GAME_ID).first()
+        print(f"game status {game.status}, interval logs {orders}, last owner {lease.owner} (epoch {lease.epoch})")
+        if game.status != "final":
+            failures.append(f"game ended as {game.status}")
+        if orders != list(range(1, len(orders) + 1)):
+            failures.append(f"interval logs are not one per tick: {orders}")
+        if lease.owner != "b" or lease.epoch < 2:
+            failures.append("node b never took the lease over")
+    finally:
+        db.close()
+    return failures
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Check game ownership, relay and takeover across two local nodes.")
+    parser.add_argument("--base-port", type=int, default=8101)
+    parser.add_argument("--lease-seconds", type=float, default=3)
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="qg2-cluster-")
+    db_url = f"sqlite:///{os.path.join(workdir, 'cluster.db')}"
+    seed(db_url)
+
+    failures = asyncio.run(run_check(args, db_url))
+    failures += check_database(db_url)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print("ok")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
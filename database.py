@@ -1,18 +1,72 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 from models import Base
+from metrics import instrument_engine
+from player_search import SEARCH_DDL, create_search_index
+import os
+import zlib
 
 # ----------------------------------------------------------------------
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./qg2.db"
+# Several app processes can share one database (see leases.py).
+SQLALCHEMY_DATABASE_URL = os.environ.get("QG2_DATABASE_URL", "sqlite:///./qg2.db")
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def schema_version() -> int:
+    # Fingerprint of every table and column the models declare. Stored in
+    # SQLite's user_version so a boot against an up-to-date file can skip
+    # create_all and the column checks entirely.
+    parts = []
+    for table in sorted(Base.metadata.tables.values(), key=lambda table: table.name):
+        for column in table.columns:
+            parts.append(f"{table.name}.{column.name}:{column.type!r}:{column.nullable}")
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            parts.append(f"{table.name}.{index.name}")
+    parts.extend(SEARCH_DDL)
+    return zlib.crc32("\n".join(parts).encode("utf-8")) & 0x7fffffff
+
 def create_db_and_tables():
+    version = schema_version()
+    with engine.connect() as conn:
+        if conn.execute(text("PRAGMA user_version")).scalar() == version:
+            return
+    with engine.begin() as conn:
+        if not inspect(conn).get_table_names():
+            # Only takes effect before the first table exists; lets the log
+            # retention job hand freed pages back (see log_compaction.py).
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    add_missing_indexes()
+    with engine.begin() as conn:
+        create_search_index(conn)
+    with engine.begin() as conn:
+        conn.execute(text(f"PRAGMA user_version = {version}"))
+
+def add_missing_columns():
+    # create_all never alters existing tables, so nullable columns added to
+    # the models after a database was created are added here.
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.tables.values():
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+
+def add_missing_indexes():
+    # Likewise for indexes declared on tables that already exist.
+    with engine.begin() as conn:
+        for table in Base.metadata.tables.values():
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
 
 def get_db():
     db = SessionLocal()
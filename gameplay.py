@@ -5,6 +5,15 @@ from models import (
     League as DBLeague, Team as DBTeam, Game as DBGame,
     GameIntervalLog as DBGIL, Snitch as DBSnitch, Bludger as DBBludger
 )
+from rng import get_game_rng, reset_game_rng, restore_game_rng
+from matchups import (
+    BEATER_ATTRIBUTES, attribute_matrix, compile_matchup, draw_beater_performance, get_game_matchup, set_game_matchup,
+    get_beater_performance as get_matchup_beater_performance
+)
+from player_stats import build_game_stats, get_game_stats, set_game_stats, distance
+from types import SimpleNamespace
+import metrics
+import json
 import random
 
 # ----------------------------------------------------------------------
@@ -19,6 +28,9 @@ starter_depth_thresholds = {
 matrix_size = {'x': 13, 'y': 8, 'z': 8}
 spacing = 1.0
 
+game_total_time = 5
+game_increment = 1
+
 # ----------------------------------------------------------------------
 
 def get_missing_starters(db: Session, team_id: int) -> dict:
@@ -69,23 +81,12 @@ def get_team_lineup(db: Session, team_id: int, lineup_type: str) -> dict:
 
     return lineup
 
-def get_beater_performance(team_beaters: list, opponent_beaters: list) -> dict:
-    team_beater_performance = 0
-    opponent_beater_performance = 0
-
-    for beater in team_beaters:
-        skill_mod = random.uniform(0.1, 0.45)
-        strength_mod = random.uniform(0.3, 0.65)
-        speed_mod = random.uniform(0.1, 0.25)
-        team_beater_performance += (beater.strength * strength_mod) + (beater.skill * skill_mod) + (beater.speed * speed_mod)
-
-    for beater in opponent_beaters:
-        skill_mod = random.uniform(0.1, 0.45)
-        strength_mod = random.uniform(0.3, 0.65)
-        speed_mod = random.uniform(0.1, 0.25)
-        opponent_beater_performance += (beater.strength * strength_mod) + (beater.skill * skill_mod) + (beater.speed * speed_mod)
-
-    return {"team_beater_performance": team_beater_performance, "opponent_beater_performance": opponent_beater_performance}
+def get_beater_performance(team_beaters: list, opponent_beaters: list, rng=None) -> dict:
+    # Totals for two lists of beaters, drawn with a numpy Generator. Ticks
+    # draw from the tables compiled at game start instead.
+    team = draw_beater_performance(attribute_matrix(team_beaters, BEATER_ATTRIBUTES), rng)
+    opponent = draw_beater_performance(attribute_matrix(opponent_beaters, BEATER_ATTRIBUTES), rng)
+    return {"team_beater_performance": float(team.sum()), "opponent_beater_performance": float(opponent.sum())}
 
 # get_chaser_performance
 # take in team's chasers, opponent's chasers, both team's beater performance.
@@ -101,20 +102,10 @@ def handle_team_performance(db: Session, game_id: int) -> dict:
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
 
-    # Get the home team's lineup
-    home_starters = get_team_lineup(db, game.home_team_id, "starters")
-
-    # Get the away team's lineup
-    opponent_starters = get_team_lineup(db, game.away_team_id, "starters")
+    matchup = get_matchup(db, game)
 
     # Calculate the performance of the team's various positions
-    performance = {"Seeker": 0, "Keeper": 0, "Beater": 0, "Chaser": 0}
-    for position in performance:
-        for player in home_starters[position]:
-            performance[position] += player.skill
-
-        for player in opponent_starters[position]:
-            performance[position] -= player.skill
+    performance = dict(matchup["skill_diff"])
 
     # Calculate the team's goals scored and snitch catches
     goals_scored = 0
@@ -123,6 +114,17 @@ def handle_team_performance(db: Session, game_id: int) -> dict:
     # return {"goals_score": goals_scored, "snitch_catches": snitch_catches}
     return performance
 
+def get_matchup(db: Session, game: DBGame) -> dict:
+    # Games started through start_game_simulation already have their tables;
+    # anything else is compiled from the current starting lineups.
+    matchup = get_game_matchup(game.id)
+    if matchup is None:
+        matchup = compile_matchup(
+            get_team_lineup(db, game.home_team_id, "starters"),
+            get_team_lineup(db, game.away_team_id, "starters")
+        )
+    return matchup
+
 # function handle_game_log.
 # take in a game id.
 # find all the game logs of this game.
@@ -137,7 +139,7 @@ def handle_team_performance(db: Session, game_id: int) -> dict:
 
 
 
-def handle_player_movement(db: Session, team_id: int, game_id: int) -> dict:
+def handle_player_movement(db: Session, team_id: int, game_id: int, rng: random.Random = random, stats=None) -> dict:
     team = db.query(DBTeam).filter(DBTeam.id == team_id).first()
     if not team:
         raise HTTPException(status_code=404, detail="Team not found - player movement")
@@ -149,30 +151,36 @@ def handle_player_movement(db: Session, team_id: int, game_id: int) -> dict:
     # Get the team's starting lineup
     starters = get_team_lineup(db, team_id, "starters")
 
-    # Generate a random number for each player
-    player_movements = {}
+    return move_lineup(starters, rng, stats)
 
+def move_lineup(starters: dict, rng: random.Random = random, stats=None) -> dict:
     player_movements = {}
     for position_name in starter_depth_thresholds:
         for count, player in enumerate(starters[position_name]):
-            player_movement = generate_player_position(player)
+            previous = (player.location_x or 0, player.location_y or 0, player.location_z or 0)
+            player_movement = generate_player_position(player, rng)
+            if stats is not None:
+                stats.record_movement(player.id, distance(previous, (player.location_x, player.location_y, player.location_z)))
 
             player_movements[f"{position_name}_{count + 1}"] = player_movement
 
     return player_movements
 
-def generate_player_position(player: DBPlayer):
+def random_coordinate(axis: str, rng: random.Random = random) -> float:
+    return (rng.random() * (matrix_size[axis] - 1) - (matrix_size[axis] - 1) / 2) * spacing
+
+def generate_player_position(player: DBPlayer, rng: random.Random = random):
     if not player.target_x and not player.target_y and not player.target_z:
-        player.location_x = (random.random() * (matrix_size['x'] - 1) - (matrix_size['x'] - 1) / 2) * spacing
-        player.location_y = (random.random() * (matrix_size['y'] - 1) - (matrix_size['y'] - 1) / 2) * spacing
-        player.location_z = (random.random() * (matrix_size['z'] - 1) - (matrix_size['z'] - 1) / 2) * spacing
+        player.location_x = random_coordinate('x', rng)
+        player.location_y = random_coordinate('y', rng)
+        player.location_z = random_coordinate('z', rng)
     else:
         player.location_x = player.target_x
         player.location_y = player.target_y
         player.location_z = player.target_z
-    player.target_x = (random.random() * (matrix_size['x'] - 1) - (matrix_size['x'] - 1) / 2) * spacing
-    player.target_y = (random.random() * (matrix_size['y'] - 1) - (matrix_size['y'] - 1) / 2) * spacing
-    player.target_z = (random.random() * (matrix_size['z'] - 1) - (matrix_size['z'] - 1) / 2) * spacing
+    player.target_x = random_coordinate('x', rng)
+    player.target_y = random_coordinate('y', rng)
+    player.target_z = random_coordinate('z', rng)
     position = {
         'x': player.location_x,
         'y': player.location_y,
@@ -190,28 +198,28 @@ def generate_player_position(player: DBPlayer):
         'target': target
     }
 
-def handle_snitch_placement(db: Session, game_id: int) -> dict:
+def handle_snitch_placement(db: Session, game_id: int, rng: random.Random = random) -> dict:
     game = db.query(DBGame).filter(DBGame.id == game_id).first()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found - snitch placement")
 
     if not game.snitch:
         snitch = DBSnitch(
-            x=(random.random() * (matrix_size['x'] - 1) - (matrix_size['x'] - 1) / 2) * spacing,
-            y=(random.random() * (matrix_size['y'] - 1) - (matrix_size['y'] - 1) / 2) * spacing,
-            z=(random.random() * (matrix_size['z'] - 1) - (matrix_size['z'] - 1) / 2) * spacing,
+            x=random_coordinate('x', rng),
+            y=random_coordinate('y', rng),
+            z=random_coordinate('z', rng),
             game_id=game_id
         )
         db.add(snitch)
         db.commit()
     else:
         snitch = game.snitch
-        snitch.x = (random.random() * (matrix_size['x'] - 1) - (matrix_size['x'] - 1) / 2) * spacing
-        snitch.y = (random.random() * (matrix_size['y'] - 1) - (matrix_size['y'] - 1) / 2) * spacing
-        snitch.z = (random.random() * (matrix_size['z'] - 1) - (matrix_size['z'] - 1) / 2) * spacing
+        snitch.x = random_coordinate('x', rng)
+        snitch.y = random_coordinate('y', rng)
+        snitch.z = random_coordinate('z', rng)
         db.commit()
 
-def handle_snitch_catch(db: Session, game_id: int) -> bool:
+def handle_snitch_catch(db: Session, game_id: int, stats=None) -> bool:
     game = db.query(DBGame).filter(DBGame.id == game_id).first()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found - snitch catch")
@@ -223,9 +231,18 @@ def handle_snitch_catch(db: Session, game_id: int) -> bool:
     if not team_1 or not team_2:
         raise HTTPException(status_code=404, detail="Teams not found")
     
-    seeker_1 = db.query(DBPlayer).filter(DBPlayer.team_id == team_1.id, DBPlayer.current_position == "Seeker").first()
-    seeker_2 = db.query(DBPlayer).filter(DBPlayer.team_id == team_2.id, DBPlayer.current_position == "Seeker").first()
-
+    seeker_1 = db.query(DBPlayer).filter(DBPlayer.team_id == team_1.id, DBPlayer.current_position == "Seeker").order_by(DBPlayer.depth).first()
+    seeker_2 = db.query(DBPlayer).filter(DBPlayer.team_id == team_2.id, DBPlayer.current_position == "Seeker").order_by(DBPlayer.depth).first()
+
+    result = resolve_snitch_catch(seeker_1, seeker_2, snitch)
+    if stats is not None:
+        snitch_location = (snitch.x, snitch.y, snitch.z)
+        for seeker, side in ((seeker_1, "HOME"), (seeker_2, "AWAY")):
+            seeker_location = (seeker.location_x, seeker.location_y, seeker.location_z)
+            stats.record_seeker(seeker.id, distance(seeker_location, snitch_location), result == side, game_increment)
+    return result
+
+def resolve_snitch_catch(seeker_1, seeker_2, snitch):
     distance_1 = ((seeker_1.location_x - snitch.x) ** 2 + (seeker_1.location_y - snitch.y) ** 2 + (seeker_1.location_z - snitch.z) ** 2) ** 0.5
     distance_2 = ((seeker_2.location_x - snitch.x) ** 2 + (seeker_2.location_y - snitch.y) ** 2 + (seeker_2.location_z - snitch.z) ** 2) ** 0.5
 
@@ -237,4 +254,186 @@ def handle_snitch_catch(db: Session, game_id: int) -> bool:
         else:
             None
     else:
-        return None
\ No newline at end of file
+        return None
+
+def start_game_simulation(db: Session, game_id: int):
+    # Reset the game's RNG stream and lay out both starting lineups from it,
+    # so the whole game is a function of (seed, lineup).
+    game = db.query(DBGame).filter(DBGame.id == game_id).first()
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found - game start")
+
+    rng = reset_game_rng(game).random
+    lineup = {}
+    starters = {}
+    for side, team_id in (("home", game.home_team_id), ("away", game.away_team_id)):
+        starters[side] = get_team_lineup(db, team_id, "starters")
+        lineup[side] = {position: [player.id for player in players] for position, players in starters[side].items()}
+        place_lineup(starters[side], rng)
+    matchup = compile_matchup(starters["home"], starters["away"])
+    set_game_matchup(game_id, matchup)
+    set_game_stats(game_id, build_game_stats(game, starters))
+    game.lineup = json.dumps(lineup)
+    db.commit()
+
+def restore_game_simulation(db: Session, game_id: int, state: dict, rng_state: list):
+    # Put a game back exactly where a snapshot left it: RNG stream, starter
+    # positions, snitch and interval logs. Ticks after the snapshot are
+    # discarded and will be re-run from the restored stream.
+    game = db.query(DBGame).filter(DBGame.id == game_id).first()
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found - game resume")
+
+    restore_game_rng(game, rng_state)
+
+    players = state["players"]
+    for player in db.query(DBPlayer).filter(DBPlayer.id.in_([int(player_id) for player_id in players])).all():
+        (player.location_x, player.location_y, player.location_z,
+         player.target_x, player.target_y, player.target_z) = players[str(player.id)]
+
+    snitch = state.get("snitch")
+    if snitch:
+        if game.snitch:
+            game.snitch.x, game.snitch.y, game.snitch.z = snitch["x"], snitch["y"], snitch["z"]
+        else:
+            db.add(DBSnitch(x=snitch["x"], y=snitch["y"], z=snitch["z"], game_id=game_id))
+
+    db.query(DBGIL).filter(DBGIL.game_id == game_id, DBGIL.order > state["order"]).delete()
+    starters = {
+        "home": get_team_lineup(db, game.home_team_id, "starters"),
+        "away": get_team_lineup(db, game.away_team_id, "starters")
+    }
+    matchup = compile_matchup(starters["home"], starters["away"])
+    set_game_matchup(game_id, matchup)
+    stats = build_game_stats(game, starters)
+    stats.load_state(state.get("stats", {}))
+    set_game_stats(game_id, stats)
+    db.commit()
+
+def place_lineup(starters: dict, rng: random.Random = random):
+    for position_name in starter_depth_thresholds:
+        for player in starters[position_name]:
+            player.location_x = random_coordinate('x', rng)
+            player.location_y = random_coordinate('y', rng)
+            player.location_z = random_coordinate('z', rng)
+            player.target_x = random_coordinate('x', rng)
+            player.target_y = random_coordinate('y', rng)
+            player.target_z = random_coordinate('z', rng)
+
+def handle_game_tick(db: Session, game_id: int, order: int) -> dict:
+    game = db.query(DBGame).filter(DBGame.id == game_id).first()
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found - game tick")
+
+    game_rng = get_game_rng(game)
+    rng = game_rng.random
+    stats = get_game_stats(game_id)
+    last_log = db.query(DBGIL).filter(DBGIL.game_id == game_id).order_by(DBGIL.order.desc()).first()
+
+    with metrics.tick_phase("snitch_placement"):
+        handle_snitch_placement(db, game_id, rng)
+    with metrics.tick_phase("snitch_catch"):
+        catch_result = handle_snitch_catch(db, game_id, stats)
+
+    home_score = last_log.home_score if last_log else 0
+    away_score = last_log.away_score if last_log else 0
+    home_catches = (last_log.home_snitch_catches or 0) if last_log else 0
+    away_catches = (last_log.away_snitch_catches or 0) if last_log else 0
+
+    if catch_result == "HOME":
+        home_score += 35
+        home_catches += 1
+    elif catch_result == "AWAY":
+        away_score += 35
+        away_catches += 1
+
+    # Beater performance only feeds player stats and comes from the numpy
+    # stream, so scores and positions are the same with or without it.
+    matchup = get_game_matchup(game_id)
+    if matchup is not None and stats is not None:
+        with metrics.tick_phase("team_performance"):
+            beater_performance = get_matchup_beater_performance(matchup, game_rng.numpy)
+        for side in ("home", "away"):
+            stats.record_beaters(matchup[side]["beater_ids"], beater_performance[side].tolist())
+
+    with metrics.tick_phase("log_write"):
+        new_log = DBGIL(
+            game_id=game_id,
+            order=order,
+            home_score=home_score,
+            away_score=away_score,
+            home_snitch_catches=home_catches,
+            away_snitch_catches=away_catches
+        )
+        db.add(new_log)
+        db.commit()
+
+    # The game's own teams; the websocket loop this replaced moved teams 1
+    # and 2 whatever game was being played.
+    with metrics.tick_phase("movement"):
+        team_1_movement = handle_player_movement(db, game.home_team_id, game_id, rng, stats)
+        team_2_movement = handle_player_movement(db, game.away_team_id, game_id, rng, stats)
+    if stats is not None:
+        stats.record_tick()
+
+    return {
+        "home_score": home_score,
+        "away_score": away_score,
+        "team_1": team_1_movement,
+        "team_2": team_2_movement
+    }
+
+def replay_game(db: Session, game_id: int, ticks: int = None) -> list:
+    # Regenerate a game's frames from its seed and recorded lineup, without
+    # touching any stored positions or interval logs.
+    game = db.query(DBGame).filter(DBGame.id == game_id).first()
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found - replay")
+    if game.seed is None or not game.lineup:
+        raise HTTPException(status_code=400, detail="Game has no recorded seed and lineup")
+
+    if ticks is None:
+        ticks = int(game_total_time / game_increment)
+
+    recorded = json.loads(game.lineup)
+    player_ids = [player_id for side in recorded.values() for ids in side.values() for player_id in ids]
+    players = {player.id: player for player in db.query(DBPlayer).filter(DBPlayer.id.in_(player_ids)).all()}
+
+    def detached_starters(side: str) -> dict:
+        return {
+            position: [SimpleNamespace(id=player_id, strength=players[player_id].strength,
+                                       skill=players[player_id].skill, speed=players[player_id].speed)
+                       for player_id in recorded[side].get(position, [])]
+            for position in starter_depth_thresholds
+        }
+
+    rng = random.Random(game.seed)
+    home_starters = detached_starters("home")
+    away_starters = detached_starters("away")
+    place_lineup(home_starters, rng)
+    place_lineup(away_starters, rng)
+
+    snitch = SimpleNamespace(x=0, y=0, z=0)
+    home_score = 0
+    away_score = 0
+    frames = []
+    for order in range(1, ticks + 1):
+        snitch.x = random_coordinate('x', rng)
+        snitch.y = random_coordinate('y', rng)
+        snitch.z = random_coordinate('z', rng)
+
+        catch_result = resolve_snitch_catch(home_starters["Seeker"][0], away_starters["Seeker"][0], snitch)
+        if catch_result == "HOME":
+            home_score += 35
+        elif catch_result == "AWAY":
+            away_score += 35
+
+        frames.append({
+            "order": order,
+            "home_score": home_score,
+            "away_score": away_score,
+            "team_1": move_lineup(home_starters, rng),
+            "team_2": move_lineup(away_starters, rng)
+        })
+
+    return frames
@@ -1,48 +1,79 @@
 import json
+import os
 import random
 from models import Player as DBPlayer
 from sqlalchemy.orm import Session
 
 # ----------------------------------------------------------------------
 
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Data assets are read once per process into immutable tuples. Loading them
+# before workers fork (see preload_data_assets) lets every worker share the
+# same pages instead of re-reading the files for every generated player.
+_name_lists = {}
+_position_data = None
+
+# ----------------------------------------------------------------------
+
+def data_path(file_path):
+    if os.path.isabs(file_path):
+        return file_path
+    relative = file_path[len('data/'):] if file_path.startswith('data/') else file_path
+    return os.path.join(DATA_DIR, relative)
+
 def load_position_data():
-    with open('data/positions.json') as f:
-        return json.load(f)
+    global _position_data
+    if _position_data is None:
+        with open(data_path('data/positions.json')) as f:
+            _position_data = json.load(f)
+    return _position_data
+
+def load_names(file_path):
+    names = _name_lists.get(file_path)
+    if names is None:
+        with open(data_path(file_path)) as f:
+            names = _name_lists[file_path] = tuple(line.strip() for line in f.readlines())
+    return names
 
-def random_name(file_path):
-    with open(file_path) as f:
-        names = f.readlines()
-    return random.choice(names).strip()
+def preload_data_assets():
+    load_position_data()
+    for file_name in ('first_names.txt', 'last_names.txt', 'countries.txt'):
+        load_names(f'data/{file_name}')
 
-def generate_player_attributes(position, attribute_ranges):
+def random_name(file_path, rng: random.Random = random):
+    return rng.choice(load_names(file_path))
+
+def generate_player_attributes(position, attribute_ranges, rng: random.Random = random):
     attributes = {}
     for attribute in ["speed", "strength", "skill", "toughness", "awareness", "teamwork"]:
         default_range = (0, 100)
         range_values = attribute_ranges.get(attribute, default_range)
-        attributes[attribute] = random.randint(*range_values)
+        attributes[attribute] = rng.randint(*range_values)
     return attributes
 
-def generate_players(total_players: int, db: Session):
+def generate_players(total_players: int, db: Session, rng: random.Random = random):
     position_data = load_position_data()
+    positions = list(position_data.keys())
     players = []
 
     for _ in range(total_players):
-        position = random.choice(list(position_data.keys()))
-        attributes = generate_player_attributes(position, position_data[position])
-        player_age = random.randint(17, 55)
+        position = rng.choice(positions)
+        attributes = generate_player_attributes(position, position_data[position], rng)
+        player_age = rng.randint(17, 55)
         new_player = DBPlayer(
-            first_name=random_name('data/first_names.txt'),
-            last_name=random_name('data/last_names.txt'),
-            country=random_name('data/countries.txt'),
+            first_name=random_name('data/first_names.txt', rng),
+            last_name=random_name('data/last_names.txt', rng),
+            country=random_name('data/countries.txt', rng),
             age=player_age,
-            years_pro=random.randint(0, player_age - 17),
+            years_pro=rng.randint(0, player_age - 17),
             toughness=attributes["toughness"],
             awareness=attributes["awareness"],
             teamwork=attributes["teamwork"],
             speed=attributes["speed"],
             strength=attributes["strength"],
             skill=attributes["skill"],
-            injury=random.randint(0, 100),
+            injury=rng.randint(0, 100),
             primary_position=position,
             current_position=position,
         )
@@ -51,3 +82,22 @@ def generate_players(total_players: int, db: Session):
 
     db.commit()
     return players
+
+def generate_players_in_chunks(session_factory, total_players: int, rng: random.Random = random,
+                               chunk_size: int = 1000, on_chunk=None, progress=None) -> int:
+    # For large requests: each chunk is generated, committed and released
+    # before the next, with a fresh session, so memory stays flat.
+    done = 0
+    while done < total_players:
+        count = min(chunk_size, total_players - done)
+        db = session_factory()
+        try:
+            generate_players(count, db, rng)
+        finally:
+            db.close()
+        done += count
+        if on_chunk:
+            on_chunk()
+        if progress:
+            progress(done)
+    return done
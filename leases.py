@@ -0,0 +1,115 @@
+from sqlalchemy import event, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import GameLease as DBGameLease
+from datetime import datetime, timedelta
+import os
+import secrets
+import socket
+
+# ----------------------------------------------------------------------
+# Game ownership across app processes sharing one database.
+#
+# The node simulating a game holds a lease row on it and renews it while the
+# game runs. Other nodes never tick a leased game: they relay spectators to
+# the owner's websocket (QG2_NODE_URL of the owner), and once a lease expires
+# without renewal any node may claim it and resume the game from its last
+# snapshot. Every claim bumps the lease epoch, and renewals only succeed for
+# the current (owner, epoch). The owner's game session is also fenced: each
+# commit first checks (owner, epoch) in the same transaction, so a stalled
+# former owner can't write a tick, snapshot or result after a takeover.
+#
+# Locally, run several processes against one database:
+#   QG2_DATABASE_URL=sqlite:////tmp/qg2.db QG2_NODE_ID=a QG2_NODE_URL=ws://127.0.0.1:8001 uvicorn main:app --port 8001
+#   QG2_DATABASE_URL=sqlite:////tmp/qg2.db QG2_NODE_ID=b QG2_NODE_URL=ws://127.0.0.1:8002 uvicorn main:app --port 8002
+# cluster_check.py does exactly that and checks relay and takeover.
+
+LEASE_SECONDS = float(os.environ.get("QG2_LEASE_SECONDS", 15))
+HEARTBEAT_SECONDS = float(os.environ.get("QG2_HEARTBEAT_SECONDS", 5))
+
+NODE_ID = os.environ.get("QG2_NODE_ID") or f"{socket.gethostname()}-{os.getpid()}-{secrets.token_hex(3)}"
+NODE_URL = os.environ.get("QG2_NODE_URL")
+
+# ----------------------------------------------------------------------
+
+class LeaseHeld(Exception):
+    # The game is being simulated by another live node.
+    def __init__(self, game_id: int, owner: str, owner_url: str, expires_at: datetime):
+        super().__init__(f"Game {game_id} is owned by {owner}")
+        self.game_id = game_id
+        self.owner = owner
+        self.owner_url = owner_url
+        self.expires_at = expires_at
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, int((self.expires_at - datetime.utcnow()).total_seconds()) + 1)
+
+class LeaseLost(Exception):
+    # Another node took over the game while this one was simulating it.
+    pass
+
+def acquire(db: Session, game_id: int) -> int:
+    # Claims the game for this node and returns the lease epoch. Raises
+    # LeaseHeld when another node holds an unexpired lease.
+    now = datetime.utcnow()
+    values = {"owner": NODE_ID, "owner_url": NODE_URL, "heartbeat_at": now, "expires_at": now + timedelta(seconds=LEASE_SECONDS)}
+    claimed = db.execute(
+        update(DBGameLease)
+        .where(DBGameLease.game_id == game_id, or_(DBGameLease.owner == NODE_ID, DBGameLease.expires_at < now))
+        .values(epoch=DBGameLease.epoch + 1, **values)
+    ).rowcount
+    if not claimed:
+        try:
+            db.add(DBGameLease(game_id=game_id, epoch=1, **values))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            lease = db.query(DBGameLease).filter(DBGameLease.game_id == game_id).first()
+            raise LeaseHeld(game_id, lease.owner, lease.owner_url, lease.expires_at)
+    else:
+        db.commit()
+    return db.query(DBGameLease.epoch).filter(DBGameLease.game_id == game_id).scalar()
+
+def renew(db: Session, game_id: int, epoch: int) -> bool:
+    now = datetime.utcnow()
+    renewed = db.execute(
+        update(DBGameLease)
+        .where(DBGameLease.game_id == game_id, DBGameLease.owner == NODE_ID, DBGameLease.epoch == epoch)
+        .values(heartbeat_at=now, expires_at=now + timedelta(seconds=LEASE_SECONDS))
+    ).rowcount
+    db.commit()
+    return bool(renewed)
+
+def fence(db: Session, game_id: int, epoch: int):
+    # Every later commit on `db` raises LeaseLost, writing nothing, unless
+    # this node still holds the lease at `epoch`. The check is an UPDATE so
+    # SQLite takes the write lock with it: no claim lands between the check
+    # and the commit.
+    def check(session: Session):
+        held = session.execute(
+            update(DBGameLease)
+            .where(DBGameLease.game_id == game_id, DBGameLease.owner == NODE_ID, DBGameLease.epoch == epoch)
+            .values(epoch=DBGameLease.epoch)
+        ).rowcount
+        if not held:
+            raise LeaseLost(game_id)
+    event.listen(db, "before_commit", check)
+
+def release(db: Session, game_id: int, epoch: int):
+    # Expires the lease now, so another node can take over without waiting.
+    db.execute(
+        update(DBGameLease)
+        .where(DBGameLease.game_id == game_id, DBGameLease.owner == NODE_ID, DBGameLease.epoch == epoch)
+        .values(expires_at=datetime.utcnow())
+    )
+    db.commit()
+
+def held_elsewhere(db: Session) -> set:
+    # Ids of games another node is currently simulating.
+    now = datetime.utcnow()
+    return {
+        game_id for (game_id,) in db.query(DBGameLease.game_id).filter(
+            DBGameLease.owner != NODE_ID, DBGameLease.expires_at >= now
+        )
+    }
@@ -0,0 +1,433 @@
+from collections import deque
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from models import Game as DBGame, GameIntervalLog as DBGIL, GameSnapshot as DBGameSnapshot, Player as DBPlayer
+from gameplay import (
+    handle_game_tick, start_game_simulation, restore_game_simulation, game_total_time, game_increment
+)
+from rng import get_game_rng, dump_rng_state, release_game_rng
+from matchups import release_game_matchup
+from standings import finalize_game
+from player_stats import flush_game_stats, get_game_stats, release_game_stats
+from log_compaction import compact_game
+from datetime import datetime
+import asyncio
+import json
+import logging
+import time
+import database
+import metrics
+import cache
+import admission
+import leases
+import profiling
+
+# ----------------------------------------------------------------------
+# Live games run as their own asyncio tasks, independent of any websocket.
+# Connections subscribe to a game and receive serialized frames; a client
+# that reconnects with the last sequence number it saw gets only what it
+# missed (buffered frames, or the latest snapshot plus the frames since).
+# Snapshots are also persisted, so a restarted worker resumes interrupted
+# games from the last one instead of starting over.
+
+logger = logging.getLogger(__name__)
+
+# Seconds between game ticks; benchmarks set this to 0.
+GAME_TICK_DELAY = 1
+# Ticks between snapshots, and how many frames are kept for catch-up. The
+# buffer must hold at least a snapshot interval of frames.
+SNAPSHOT_EVERY = 5
+FRAME_BUFFER_SIZE = 120
+# A subscriber that falls this many frames behind is disconnected and has to
+# resume; one slow client never holds up the game or other spectators.
+SUBSCRIBER_QUEUE_LIMIT = 64
+# How long a finished game stays in memory for late or reconnecting clients.
+FINISHED_RETENTION_SECONDS = 60
+
+# Session factory for game tasks. Swapped out by benchmarks and tests.
+session_factory = database.SessionLocal
+
+_live_games = {}
+
+GAME_OVER_FRAME = json.dumps({"type": "game_over", "message": "Game over"}, separators=(",", ":"))
+
+# ----------------------------------------------------------------------
+
+class Subscription:
+    def __init__(self, last_seq: int = None):
+        self.queue = asyncio.Queue()
+        self.dropped = False
+        # Frames up to here were acknowledged by the client and are never
+        # sent again, even when a game resumed from an older snapshot
+        # publishes them a second time.
+        self.last_seq = last_seq
+
+    async def next_frame(self):
+        # Returns (seq, message_type, payload, final), or None once the
+        # subscription was dropped or closed.
+        return await self.queue.get()
+
+    def close(self):
+        self.queue.put_nowait(None)
+
+class LiveGame:
+    def __init__(self, game_id: int):
+        self.game_id = game_id
+        self.frames = deque(maxlen=FRAME_BUFFER_SIZE)
+        self.snapshot = None
+        self.final_frame = None
+        self.last_seq = 0
+        self.subscribers = set()
+        self.task = None
+        self.lease_epoch = None
+
+    @property
+    def finished(self) -> bool:
+        return self.final_frame is not None
+
+    def subscribe(self, last_seq: int = None) -> Subscription:
+        subscription = Subscription(last_seq)
+        for frame in self.catch_up_frames(last_seq):
+            subscription.queue.put_nowait(frame)
+        if self.final_frame is not None:
+            subscription.queue.put_nowait(self.final_frame)
+        else:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def catch_up_frames(self, last_seq: int = None) -> list:
+        if last_seq is None:
+            # New spectators of a game in progress start from the snapshot.
+            if self.last_seq == 0 or self.snapshot is None:
+                return list(self.frames)
+            last_seq = -1
+        if last_seq >= self.last_seq:
+            return []
+        if self.frames and self.frames[0][0] <= last_seq + 1:
+            return [frame for frame in self.frames if frame[0] > last_seq]
+        if self.snapshot is None:
+            # Nothing older to rebuild from; send everything still buffered.
+            return list(self.frames)
+        snapshot_seq, payload = self.snapshot
+        return [(snapshot_seq, "game_snapshot", payload, False)] + [frame for frame in self.frames if frame[0] > snapshot_seq]
+
+    def publish(self, seq: int, message_type: str, payload: str, final: bool = False):
+        frame = (seq, message_type, payload, final)
+        if final:
+            self.final_frame = frame
+        else:
+            self.frames.append(frame)
+            self.last_seq = seq
+        for subscription in list(self.subscribers):
+            if not final and subscription.last_seq is not None and seq <= subscription.last_seq:
+                continue
+            if subscription.queue.qsize() >= SUBSCRIBER_QUEUE_LIMIT:
+                self.drop(subscription)
+                continue
+            subscription.queue.put_nowait(frame)
+        if final:
+            self.subscribers.clear()
+
+    def drop(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+        subscription.dropped = True
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+# ----------------------------------------------------------------------
+
+def game_settings(game_time: int) -> dict:
+    return {
+        "total_time": game_total_time,
+        "interval": game_increment,
+        "current_time": game_time,
+        "matrix_size": { "x": 13, "y": 8, "z": 8 },
+        "spacing": 1.0,
+        "speed": 0.1,
+        "team_1_color": 0xff0000,
+        "team_2_color": 0x0000ff
+    }
+
+def build_state(game_id: int, order: int, score: dict, snitch, players: dict) -> dict:
+    stats = get_game_stats(game_id)
+    return {
+        "order": order,
+        "score": score,
+        "snitch": {"x": snitch.x, "y": snitch.y, "z": snitch.z} if snitch else None,
+        "players": players,
+        "stats": stats.to_state() if stats else {},
+    }
+
+def tick_players(tick: dict) -> dict:
+    players = {}
+    for team in ("team_1", "team_2"):
+        for movement in tick[team].values():
+            position, target = movement["position"], movement["target"]
+            players[str(movement["id"])] = [
+                position["x"], position["y"], position["z"], target["x"], target["y"], target["z"]
+            ]
+    return players
+
+def lineup_players(db: Session, game: DBGame) -> dict:
+    lineup = json.loads(game.lineup)
+    player_ids = [player_id for side in lineup.values() for ids in side.values() for player_id in ids]
+    return {
+        str(player.id): [player.location_x, player.location_y, player.location_z,
+                         player.target_x, player.target_y, player.target_z]
+        for player in db.query(DBPlayer).filter(DBPlayer.id.in_(player_ids)).all()
+    }
+
+def persist_snapshot(db: Session, game: DBGame, seq: int, state: dict):
+    snapshot = db.query(DBGameSnapshot).filter(DBGameSnapshot.game_id == game.id).first()
+    if not snapshot:
+        snapshot = DBGameSnapshot(game_id=game.id)
+        db.add(snapshot)
+    snapshot.seq = seq
+    snapshot.state = json.dumps(state)
+    snapshot.rng_state = json.dumps(dump_rng_state(get_game_rng(game)))
+    snapshot.updated_at = datetime.utcnow()
+    db.commit()
+
+def encode_frame(data: dict) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+def snapshot_payload(seq: int, state: dict) -> str:
+    return encode_frame({
+        "type": "game_snapshot",
+        "seq": seq,
+        "sent_at": time.time(),
+        "message": {
+            "score": state["score"],
+            "settings": game_settings(state["order"] * game_increment),
+            "snitch": state["snitch"],
+            "players": state["players"]
+        }
+    })
+
+# ----------------------------------------------------------------------
+
+async def run_game(live_game: LiveGame, start_order: int):
+    db = session_factory()
+    game_id = live_game.game_id
+    if live_game.lease_epoch is not None:
+        leases.fence(db, game_id, live_game.lease_epoch)
+    total_ticks = int(game_total_time / game_increment)
+    metrics.ACTIVE_GAMES.inc()
+    renewed_at = time.monotonic()
+    try:
+        for order in range(start_order + 1, total_ticks + 1):
+            if time.monotonic() - renewed_at >= leases.HEARTBEAT_SECONDS:
+                renew_lease(db, live_game)
+                renewed_at = time.monotonic()
+            tick_start = time.perf_counter()
+            profile = profiling.game_profile(game_id)
+            with metrics.sql_scope("tick"):
+                if profile is None:
+                    tick = handle_game_tick(db, game_id, order)
+                else:
+                    tick = profile.run(handle_game_tick, db, game_id, order)
+            metrics.TICK_SECONDS.observe(time.perf_counter() - tick_start)
+
+            live_game.publish(order, "game_state_update", encode_frame({
+                "type": "game_state_update",
+                "seq": order,
+                "sent_at": time.time(),
+                "message": {
+                    "score": {
+                        "team_1": tick["home_score"],
+                        "team_2": tick["away_score"]
+                    },
+                    "settings": game_settings(order * game_increment),
+                    "team_1": tick["team_1"],
+                    "team_2": tick["team_2"]
+                }
+            }))
+
+            if order % SNAPSHOT_EVERY == 0 or order == total_ticks:
+                game = db.query(DBGame).filter(DBGame.id == game_id).first()
+                score = {"team_1": tick["home_score"], "team_2": tick["away_score"]}
+                state = build_state(game_id, order, score, game.snitch, tick_players(tick))
+                live_game.snapshot = (order, snapshot_payload(order, state))
+                persist_snapshot(db, game, order, state)
+
+            if order < total_ticks:
+                await asyncio.sleep(GAME_TICK_DELAY)
+
+        renew_lease(db, live_game)
+        game = db.query(DBGame).filter(DBGame.id == game_id).first()
+        if finalize_game(db, game):
+            flush_game_stats(db, game)
+            compact_game(db, game_id)
+        db.commit()
+        # Roster responses carry player locations as of the last game start
+        # or finish; live positions only go out through the game's frames.
+        cache.invalidate("players", "standings", "player_stats")
+        live_game.publish(live_game.last_seq, "game_over", GAME_OVER_FRAME, final=True)
+    except asyncio.CancelledError:
+        raise
+    except leases.LeaseLost:
+        logger.warning("Game %s was taken over by another node", game_id)
+        db.rollback()
+        live_game.lease_epoch = None
+        live_game.publish(live_game.last_seq, "game_error", encode_frame({"type": "game_error", "message": "Game moved to another server"}), final=True)
+        _live_games.pop(game_id, None)
+    except Exception as e:
+        logger.exception("Game %s stopped: %s", game_id, e)
+        db.rollback()
+        live_game.publish(live_game.last_seq, "game_error", encode_frame({"type": "game_error", "message": "Game interrupted"}), final=True)
+        # Drop it now so the next start resumes from the persisted snapshot.
+        _live_games.pop(game_id, None)
+    finally:
+        if live_game.lease_epoch is not None:
+            release_lease(db, live_game)
+        db.close()
+        metrics.ACTIVE_GAMES.dec()
+        release_game_rng(game_id)
+        release_game_matchup(game_id)
+        release_game_stats(game_id)
+        asyncio.get_running_loop().call_later(FINISHED_RETENTION_SECONDS, forget_game, live_game)
+
+def renew_lease(db: Session, live_game: LiveGame):
+    if not leases.renew(db, live_game.game_id, live_game.lease_epoch):
+        raise leases.LeaseLost(live_game.game_id)
+
+def release_lease(db: Session, live_game: LiveGame):
+    try:
+        leases.release(db, live_game.game_id, live_game.lease_epoch)
+    except Exception as e:
+        # The lease expires on its own; this only lets a takeover happen sooner.
+        logger.warning("Could not release the lease on game %s: %s", live_game.game_id, e)
+        db.rollback()
+    live_game.lease_epoch = None
+
+def forget_game(live_game: LiveGame):
+    if _live_games.get(live_game.game_id) is live_game:
+        del _live_games[live_game.game_id]
+
+def prepare_game(db: Session, game_id: int) -> tuple:
+    # Returns (live_game, start_order) with the game row ready to tick, or
+    # start_order None for a game that is already final. Final games are never
+    # re-run, since their result is already counted in standings and stats.
+    current_game = db.query(DBGame).filter(DBGame.id == game_id).first()
+    if not current_game:
+        current_game = DBGame(id=game_id, season_id=1, home_team_id=1, away_team_id=2, status="scheduled")
+        db.add(current_game)
+        db.commit()
+
+    live_game = LiveGame(game_id)
+    snapshot = db.query(DBGameSnapshot).filter(DBGameSnapshot.game_id == game_id).first()
+    if current_game.status == "final":
+        if snapshot:
+            live_game.snapshot = (snapshot.seq, snapshot_payload(snapshot.seq, json.loads(snapshot.state)))
+            live_game.last_seq = snapshot.seq
+        live_game.final_frame = (live_game.last_seq, "game_over", GAME_OVER_FRAME, True)
+        return live_game, None
+
+    if current_game.status == "in_progress" and snapshot:
+        state = json.loads(snapshot.state)
+        restore_game_simulation(db, game_id, state, json.loads(snapshot.rng_state))
+        live_game.snapshot = (snapshot.seq, snapshot_payload(snapshot.seq, state))
+        live_game.last_seq = snapshot.seq
+        logger.info("Resuming game %s from snapshot %s", game_id, snapshot.seq)
+        return live_game, snapshot.seq
+
+    db.query(DBGIL).filter(DBGIL.game_id == game_id).delete()
+    if snapshot:
+        db.delete(snapshot)
+    current_game.status = "in_progress"
+    db.commit()
+    start_game_simulation(db, game_id)
+
+    state = build_state(game_id, 0, {"team_1": 0, "team_2": 0}, None, lineup_players(db, current_game))
+    live_game.snapshot = (0, snapshot_payload(0, state))
+    persist_snapshot(db, current_game, 0, state)
+    return live_game, 0
+
+def running_games() -> int:
+    return sum(1 for live_game in _live_games.values() if live_game.task and not live_game.task.done())
+
+def get_or_start_game(game_id: int, admit: bool = True) -> LiveGame:
+    # Joining a running game is always allowed; starting one counts against
+    # the per-worker live game limit unless `admit` is False. Raises
+    # leases.LeaseHeld when another node is simulating the game.
+    live_game = _live_games.get(game_id)
+    if live_game is not None:
+        return live_game
+    if admit:
+        admission.check_live_game_capacity(running_games())
+
+    db = session_factory()
+    try:
+        epoch = leases.acquire(db, game_id)
+        leases.fence(db, game_id, epoch)
+        try:
+            live_game, start_order = prepare_game(db, game_id)
+        except Exception:
+            db.rollback()
+            leases.release(db, game_id, epoch)
+            raise
+        if start_order is None:
+            leases.release(db, game_id, epoch)
+        else:
+            live_game.lease_epoch = epoch
+    finally:
+        db.close()
+    _live_games[game_id] = live_game
+    loop = asyncio.get_running_loop()
+    if start_order is None:
+        loop.call_later(FINISHED_RETENTION_SECONDS, forget_game, live_game)
+    else:
+        # Starting placed the lineups, which moves them in roster responses.
+        cache.invalidate("players")
+        live_game.task = loop.create_task(run_game(live_game, start_order))
+    return live_game
+
+def get_live_game(game_id: int):
+    return _live_games.get(game_id)
+
+def resume_interrupted_games(admit: bool = False) -> list:
+    # Every game left in progress without a live owner (a restarted worker,
+    # or a node that died) picks up from its last persisted snapshot.
+    # Called at startup, then periodically by watch_orphaned_games.
+    db = session_factory()
+    try:
+        owned_elsewhere = leases.held_elsewhere(db)
+        game_ids = [game_id for (game_id,) in db.query(DBGame.id).filter(DBGame.status == "in_progress").all()]
+    finally:
+        db.close()
+
+    resumed = []
+    for game_id in game_ids:
+        if game_id in _live_games or game_id in owned_elsewhere:
+            continue
+        try:
+            get_or_start_game(game_id, admit=admit)
+            resumed.append(game_id)
+        except leases.LeaseHeld:
+            pass
+        except HTTPException as e:
+            logger.warning("Could not resume game %s: %s", game_id, e.detail)
+    return resumed
+
+async def watch_orphaned_games():
+    # Takes over games whose owner stopped renewing its lease. Takeovers
+    # count against this node's live game limit.
+    while True:
+        await asyncio.sleep(leases.HEARTBEAT_SECONDS)
+        try:
+            resumed = resume_interrupted_games(admit=True)
+            if resumed:
+                logger.info("Took over games %s", resumed)
+        except Exception as e:
+            logger.exception("Orphaned game check failed: %s", e)
+
+async def stop_all_games():
+    tasks = [live_game.task for live_game in _live_games.values() if live_game.task and not live_game.task.done()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _live_games.clear()
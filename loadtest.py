@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+# ----------------------------------------------------------------------
+# Usage (against a running server, e.g. `uvicorn main:app`):
+#   python loadtest.py --url ws://127.0.0.1:8000 --games 10,50,100,250 --spectators 1,4
+#
+# Every stage opens games * spectators websocket clients, sends start_game on
+# each and records when game_state_update frames arrive. Thousands of clients
+# need a raised open-file limit (`ulimit -n`).
+
+DEFAULT_GAME_ID_OFFSET = 1000000
+
+# ----------------------------------------------------------------------
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_client(url: str, game_id: int, args, stats: dict):
+    import websockets
+
+    expected_frames = None
+    last_arrival = None
+    last_order = 0
+    try:
+        async with websockets.connect(f"{url}/game/{game_id}", open_timeout=args.timeout, max_size=None) as websocket:
+            await websocket.send(json.dumps({"type": "start_game"}))
+            while True:
+                raw = await asyncio.wait_for(websocket.recv(), timeout=args.timeout)
+                arrival = time.time()
+                message = json.loads(raw)
+                message_type = message.get("type")
+                if message_type == "game_over":
+                    break
+                if message_type != "game_state_update":
+                    continue
+
+                settings = message["message"]["settings"]
+                interval = settings["interval"] * args.tick_delay
+                expected_frames = int(settings["total_time"] / settings["interval"])
+
+                sent_at = message.get("sent_at")
+                if sent_at is not None:
+                    stats["latency"].append(arrival - sent_at)
+                if last_arrival is not None:
+                    gap = arrival - last_arrival
+                    stats["jitter"].append(abs(gap - interval))
+                    if gap > interval * (1 + args.late_tolerance):
+                        stats["late"] += 1
+                order = int(settings["current_time"] / settings["interval"])
+                if order - last_order > 1:
+                    stats["missing"] += order - last_order - 1
+                last_order = order
+                last_arrival = arrival
+                stats["frames"] += 1
+    except Exception as e:
+        stats["errors"] += 1
+        stats["error_types"][type(e).__name__] = stats["error_types"].get(type(e).__name__, 0) + 1
+    finally:
+        # Frames never received because the stream ended early count as missing.
+        if expected_frames is not None and last_order < expected_frames:
+            stats["missing"] += expected_frames - last_order
+        stats["clients_finished"] += 1
+
+async def run_stage(args, games: int, spectators: int, first_game_id: int) -> dict:
+    stats = {
+        "frames": 0, "late": 0, "missing": 0, "errors": 0, "clients_finished": 0,
+        "latency": [], "jitter": [], "error_types": {}
+    }
+    clients = games * spectators
+    spacing = args.ramp_seconds / clients if clients else 0
+
+    async def start_client(index: int):
+        await asyncio.sleep(index * spacing)
+        await run_client(args.url, first_game_id + index // spectators, args, stats)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(start_client(index) for index in range(clients)))
+    wall = time.perf_counter() - start
+
+    expected = stats["frames"] + stats["missing"]
+    return {
+        "games": games,
+        "spectators_per_game": spectators,
+        "clients": clients,
+        "wall_seconds": wall,
+        "frames": stats["frames"],
+        "frames_per_second": stats["frames"] / wall if wall else 0.0,
+        "late_frames": stats["late"],
+        "missing_frames": stats["missing"],
+        "late_ratio": stats["late"] / stats["frames"] if stats["frames"] else 0.0,
+        "missing_ratio": stats["missing"] / expected if expected else 0.0,
+        "errors": stats["errors"],
+        "error_types": stats["error_types"],
+        "latency_p50_ms": percentile(stats["latency"], 50) * 1000,
+        "latency_p99_ms": percentile(stats["latency"], 99) * 1000,
+        "jitter_mean_ms": statistics.fmean(stats["jitter"]) * 1000 if stats["jitter"] else 0.0,
+        "jitter_p99_ms": percentile(stats["jitter"], 99) * 1000,
+    }
+
+def is_saturated(stage: dict, args) -> bool:
+    return (
+        stage["latency_p99_ms"] > args.max_p99_ms
+        or stage["late_ratio"] > args.max_late_ratio
+        or stage["missing_ratio"] > args.max_late_ratio
+        or stage["errors"] > 0
+    )
+
+async def run_load_test(args) -> dict:
+    stages = []
+    saturation = None
+    next_game_id = args.game_id_offset
+    for spectators in args.spectators:
+        for games in args.games:
+            stage = await run_stage(args, games, spectators, next_game_id)
+            next_game_id += games
+            stage["saturated"] = is_saturated(stage, args)
+            stages.append(stage)
+            print(
+                f"games={games:<6} spectators={spectators:<3} frames/s={stage['frames_per_second']:9.1f} "
+                f"p99 latency={stage['latency_p99_ms']:8.1f}ms p99 jitter={stage['jitter_p99_ms']:8.1f}ms "
+                f"late={stage['late_ratio']:.1%} missing={stage['missing_ratio']:.1%} errors={stage['errors']}"
+            )
+            if stage["saturated"]:
+                if saturation is None:
+                    saturation = {"games": games, "spectators_per_game": spectators}
+                if args.stop_on_saturation:
+                    break
+            await asyncio.sleep(args.cooldown)
+        if saturation and args.stop_on_saturation:
+            break
+    return {"config": {"url": args.url, "tick_delay": args.tick_delay}, "stages": stages, "saturation": saturation}
+
+# ----------------------------------------------------------------------
+
+def int_list(value: str) -> list:
+    return [int(item) for item in value.split(",") if item]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ramp concurrent websocket games against a running server.")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000")
+    parser.add_argument("--games", type=int_list, default=[10, 50, 100, 250, 500, 1000], help="Comma separated game counts to ramp through")
+    parser.add_argument("--spectators", type=int_list, default=[1], help="Comma separated clients per game")
+    parser.add_argument("--tick-delay", type=float, default=1.0, help="Server seconds per game tick (live_games.GAME_TICK_DELAY)")
+    parser.add_argument("--late-tolerance", type=float, default=0.25, help="Fraction of the tick interval a frame may be late")
+    parser.add_argument("--ramp-seconds", type=float, default=5.0, help="Spread connection opens over this many seconds")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--cooldown", type=float, default=2.0)
+    parser.add_argument("--max-p99-ms", type=float, default=250.0)
+    parser.add_argument("--max-late-ratio", type=float, default=0.05)
+    parser.add_argument("--stop-on-saturation", action="store_true")
+    parser.add_argument("--game-id-offset", type=int, default=DEFAULT_GAME_ID_OFFSET,
+                        help="First game id; final games are not re-run, so use a fresh offset per run against the same database")
+    parser.add_argument("--output", default="loadtest_results.json")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(run_load_test(args))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if results["saturation"]:
+        print(f"Saturated at {results['saturation']['games']} games x {results['saturation']['spectators_per_game']} spectators")
+    else:
+        print("No saturation observed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from models import Game as DBGame, GameIntervalLog as DBGIL, GameSummary as DBGameSummary
+from array import array
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import zlib
+import metrics
+
+# ----------------------------------------------------------------------
+# Usage:
+#   python log_compaction.py run                   # compact and purge now
+#   python log_compaction.py run --retention-hours 0
+#   python log_compaction.py convert               # enable incremental vacuum (offline)
+#
+# game_interval_logs gets a row per tick per game. When a game goes final
+# its rows are collapsed into one game_summaries row (final score plus the
+# whole per-tick timeline, packed) in the same transaction, and the raw rows
+# are deleted in batches once they are older than the retention window, so
+# the table only holds live games and recent history. Freed pages are handed
+# back with an incremental vacuum; databases created before this need one
+# offline `convert` to switch auto_vacuum on.
+
+logger = logging.getLogger(__name__)
+
+LOG_RETENTION_HOURS = float(os.environ.get("QG2_LOG_RETENTION_HOURS", 24 * 7))
+RETENTION_INTERVAL_SECONDS = 600
+PURGE_BATCH_SIZE = 5000
+COMPACT_BATCH_SIZE = 500
+VACUUM_PAGES_PER_BATCH = 2000
+
+# Timeline columns, one int32 row per tick.
+TIMELINE_FIELDS = ("order", "home_score", "away_score", "home_snitch_catches", "away_snitch_catches")
+
+GAMES_COMPACTED = metrics.Counter(
+    "qg2_games_compacted_total", "Finished games whose interval logs were compacted into a summary.")
+INTERVAL_LOGS_PURGED = metrics.Counter(
+    "qg2_interval_logs_purged_total", "Raw interval log rows deleted after the retention window.")
+
+# ----------------------------------------------------------------------
+
+def pack_timeline(rows: list) -> bytes:
+    # Column-major little-endian int32, so the long runs of unchanged scores
+    # compress well.
+    values = array("i", (row[field] for field in range(len(TIMELINE_FIELDS)) for row in rows))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return zlib.compress(values.tobytes())
+
+def unpack_timeline(blob: bytes) -> list:
+    values = array("i", zlib.decompress(blob))
+    if sys.byteorder == "big":
+        values.byteswap()
+    ticks = len(values) // len(TIMELINE_FIELDS)
+    columns = [values[field * ticks:(field + 1) * ticks] for field in range(len(TIMELINE_FIELDS))]
+    return [dict(zip(TIMELINE_FIELDS, row)) for row in zip(*columns)]
+
+def compact_game(db: Session, game_id: int) -> bool:
+    # Writes the summary of a final game from its interval logs, in the
+    # caller's transaction. Does nothing if the game is already compacted.
+    rows = db.query(
+        DBGIL.order, DBGIL.home_score, DBGIL.away_score, DBGIL.home_snitch_catches, DBGIL.away_snitch_catches
+    ).filter(DBGIL.game_id == game_id).order_by(DBGIL.order).all()
+    rows = [[value or 0 for value in row] for row in rows]
+    last = rows[-1] if rows else [0] * len(TIMELINE_FIELDS)
+    compacted = db.execute(insert(DBGameSummary).values(
+        game_id=game_id,
+        ticks=len(rows),
+        home_score=last[1],
+        away_score=last[2],
+        home_snitch_catches=last[3],
+        away_snitch_catches=last[4],
+        timeline=pack_timeline(rows),
+        compacted_at=datetime.utcnow(),
+    ).on_conflict_do_nothing(index_elements=["game_id"])).rowcount
+    if compacted:
+        GAMES_COMPACTED.inc()
+    return bool(compacted)
+
+def compact_finished_games(db: Session) -> int:
+    # Catches up final games that have no summary yet: games finished before
+    # compaction existed, or by a node that died before committing it.
+    count = 0
+    while True:
+        game_ids = [game_id for (game_id,) in db.query(DBGame.id).outerjoin(
+            DBGameSummary, DBGameSummary.game_id == DBGame.id
+        ).filter(DBGame.status == "final", DBGameSummary.game_id.is_(None)).limit(COMPACT_BATCH_SIZE)]
+        if not game_ids:
+            return count
+        for game_id in game_ids:
+            count += compact_game(db, game_id)
+        db.commit()
+
+def purge_compacted_logs(db: Session, retention_hours: float = LOG_RETENTION_HOURS) -> int:
+    # Deletes raw interval logs of games compacted before the retention
+    # window, a batch per transaction so ticking games are never blocked for
+    # long, then gives the freed pages back to the filesystem.
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    expired = select(DBGameSummary.game_id).where(DBGameSummary.compacted_at < cutoff, DBGameSummary.logs_purged_at.is_(None))
+    purged = 0
+    while True:
+        batch = select(DBGIL.id).where(DBGIL.game_id.in_(expired)).limit(PURGE_BATCH_SIZE)
+        deleted = db.execute(delete(DBGIL).where(DBGIL.id.in_(batch))).rowcount
+        db.commit()
+        purged += deleted
+        INTERVAL_LOGS_PURGED.inc(deleted)
+        if deleted:
+            incremental_vacuum(db)
+        if deleted < PURGE_BATCH_SIZE:
+            break
+    db.execute(
+        update(DBGameSummary)
+        .where(DBGameSummary.compacted_at < cutoff, DBGameSummary.logs_purged_at.is_(None))
+        .values(logs_purged_at=datetime.utcnow())
+    )
+    db.commit()
+    return purged
+
+def incremental_vacuum(db: Session):
+    # A no-op unless the database was created (or converted) with
+    # auto_vacuum = INCREMENTAL.
+    if db.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+        db.execute(text(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_BATCH})"))
+        db.commit()
+
+def run_retention_pass(session_factory, retention_hours: float = LOG_RETENTION_HOURS) -> tuple:
+    db = session_factory()
+    try:
+        return compact_finished_games(db), purge_compacted_logs(db, retention_hours)
+    finally:
+        db.close()
+
+async def watch_log_retention(session_factory):
+    # Runs for the life of the process; every node may run it, since both
+    # steps are idempotent.
+    while True:
+        try:
+            compacted, purged = await asyncio.to_thread(run_retention_pass, session_factory)
+            if compacted or purged:
+                logger.info("Compacted %s games, purged %s interval logs", compacted, purged)
+        except Exception as e:
+            logger.warning("Interval log retention pass failed: %s", e)
+        await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+def game_timeline(db: Session, game_id: int) -> list:
+    # Per-tick scores of a game, from its summary once compacted.
+    summary = db.query(DBGameSummary).filter(DBGameSummary.game_id == game_id).first()
+    if summary is not None:
+        return unpack_timeline(summary.timeline)
+    rows = db.query(
+        DBGIL.order, DBGIL.home_score, DBGIL.away_score, DBGIL.home_snitch_catches, DBGIL.away_snitch_catches
+    ).filter(DBGIL.game_id == game_id).order_by(DBGIL.order)
+    return [dict(zip(TIMELINE_FIELDS, (value or 0 for value in row))) for row in rows]
+
+def convert_to_incremental_vacuum(engine):
+    # Rewrites the whole file; run it with the app stopped.
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        conn.execute(text("VACUUM"))
+
+# ----------------------------------------------------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compact and expire game interval logs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run = subparsers.add_parser("run", help="Compact final games and purge expired interval logs")
+    run.add_argument("--retention-hours", type=float, default=LOG_RETENTION_HOURS)
+    subparsers.add_parser("convert", help="Switch an existing database to incremental auto-vacuum (full VACUUM)")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    import database
+    database.create_db_and_tables()
+    if args.command == "run":
+        compacted, purged = run_retention_pass(database.SessionLocal, args.retention_hours)
+        print(f"compacted {compacted} games, purged {purged} interval logs")
+    elif args.command == "convert":
+        convert_to_incremental_vacuum(database.engine)
+        print("auto_vacuum set to incremental")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
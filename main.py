@@ -1,38 +1,82 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Form, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Depends, status, Form, File, Request, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from models import User as DBUser, Player as DBPlayer, League as DBLeague, Team as DBTeam, Game as DBGame, GameIntervalLog as DBGIL
-from schemas import User, Player, LeagueCreate, TeamCreate
+from schemas import User, Player, LeagueCreate, TeamCreate, TeamStanding, StatLeader
 from fastapi.security import OAuth2PasswordRequestForm
 from contextlib import asynccontextmanager
-from database import get_db, create_db_and_tables
+from database import SessionLocal, get_db, create_db_and_tables
 from auth import authenticate_user, gen_access_token, get_token, get_user_auth, hash_password, get_current_admin_user
-from gen_players import generate_players as gen_players
+from gen_players import generate_players as gen_players, generate_players_in_chunks, preload_data_assets
 from gameplay import (
     check_all_positions_filled, get_missing_starters, get_team_lineup, handle_team_performance,
-    handle_player_movement, handle_snitch_catch, handle_snitch_placement
+    replay_game
 )
 from helpers import *
-from typing import List
+import metrics
+import cache
+import live_games
+import bulk
+import admission
+import leases
+import log_compaction
+import player_search
+import profiling
+from serializers import dump_rows, encode_json
+from standings import get_league_standings
+from player_stats import LEADERBOARD_STATS, get_season_leaders
+from typing import List, Optional
 import logging
 import json
+import os
 import random
 import asyncio
+import time
 
 # ----------------------------------------------------------------------
 
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get("QG2_LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
+# Read once at import so a preloading server (gunicorn --preload) shares the
+# data with every forked worker.
+preload_data_assets()
+
 # ----------------------------------------------------------------------
 
 @asynccontextmanager
 async def app_lifespan(app: FastAPI):
     create_db_and_tables()
+    live_games.resume_interrupted_games()
+    orphan_watcher = asyncio.create_task(live_games.watch_orphaned_games())
+    log_retention = asyncio.create_task(log_compaction.watch_log_retention(SessionLocal))
     yield
+    log_retention.cancel()
+    orphan_watcher.cancel()
+    await live_games.stop_all_games()
 
 app = FastAPI(lifespan=app_lifespan)
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response_status = 500
+    with metrics.sql_scope("request"):
+        try:
+            response = await call_next(request)
+            response_status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            route_path = route.path if route else "unmatched"
+            metrics.REQUEST_LATENCY.observe(
+                time.perf_counter() - start, request.method, route_path, response_status)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.post("/register")
 def register_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     existing_user = db.query(DBUser).filter(DBUser.username == form_data.username).first()
@@ -99,27 +143,87 @@ def create_league(name: str = Form(...), db: Session = Depends(get_db), token: s
     db.refresh(new_league)
     return new_league
 
+@app.get("/league/{league_id}/standings", response_model=List[TeamStanding])
+def get_standings(league_id: int, request: Request, season_id: Optional[int] = None, db: Session = Depends(get_db)):
+    # Defaults to the league's latest season with results.
+    def build():
+        return encode_json(get_league_standings(db, league_id, season_id))
+    return cache.cached_response(request, ("standings",), build)
+
+@app.get("/season/{season_id}/leaders/{stat}", response_model=List[StatLeader])
+def get_stat_leaders(season_id: int, stat: str, request: Request, limit: int = 10, db: Session = Depends(get_db)):
+    if stat not in LEADERBOARD_STATS:
+        raise HTTPException(status_code=400, detail=f"Unknown stat. Choose one of: {', '.join(LEADERBOARD_STATS)}")
+    limit = max(1, min(limit, 100))
+
+    def build():
+        return encode_json(get_season_leaders(db, season_id, stat, limit))
+    return cache.cached_response(request, ("player_stats",), build)
+
 # ----------------------------------------------------------------------
 # Players
 
 @app.get("/generate_players/{total_players}", response_model=List[Player])
-def generate_players(total_players: int, db: Session = Depends(get_db), token: str = Depends(get_token)):
+def generate_players(total_players: int, seed: Optional[int] = None, db: Session = Depends(get_db), token: str = Depends(get_token)):
     if not token:
         raise HTTPException(status_code=401, detail="Token not provided")
     get_current_admin_user(db, token)
+    if total_players < 1 or total_players > admission.GENERATE_MAX_PLAYERS:
+        raise HTTPException(status_code=400, detail=f"total_players must be between 1 and {admission.GENERATE_MAX_PLAYERS}")
+
+    rng = random.Random(seed) if seed is not None else random
+    if total_players > admission.GENERATE_INLINE_LIMIT:
+        # Too big to answer inline: generate in the background and let the
+        # caller poll the job.
+        def invalidate_players():
+            cache.invalidate("players")
+
+        job = admission.submit_job(
+            "generate_players", total_players, generate_players_in_chunks,
+            SessionLocal, total_players, rng, admission.GENERATE_CHUNK_SIZE, invalidate_players
+        )
+        return JSONResponse(status_code=202, content=dict(job, status_url=f"/jobs/{job['id']}"))
 
-    players = gen_players(total_players, db)
+    with admission.HEAVY_JOBS.admit():
+        players = gen_players(total_players, db, rng)
+    cache.invalidate("players")
     return players
 
 @app.get("/players", response_model=List[Player])
-def get_all_players(db: Session = Depends(get_db)):
-    players = db.query(DBPlayer).all()
-    return players
+def get_all_players(request: Request, db: Session = Depends(get_db)):
+    def build():
+        return dump_rows(db, Player, DBPlayer)
+    return cache.cached_response(request, ("players",), build)
 
 @app.get("/players/position/{position}", response_model=List[Player])
-def get_players_by_position(position: str, db: Session = Depends(get_db)):
-    players = db.query(DBPlayer).filter(DBPlayer.primary_position == position).all()
-    return players
+def get_players_by_position(position: str, request: Request, db: Session = Depends(get_db)):
+    def build():
+        return dump_rows(db, Player, DBPlayer, DBPlayer.primary_position == position)
+    return cache.cached_response(request, ("players",), build)
+
+@app.get("/players/search", response_model=List[Player])
+def search_players(
+    request: Request, q: Optional[str] = None, country: Optional[str] = None, position: Optional[str] = None,
+    sort: Optional[str] = None, limit: int = player_search.DEFAULT_LIMIT, offset: int = 0, db: Session = Depends(get_db)
+):
+    # Attribute ranges come as min_<field> / max_<field>, e.g. ?q=smi&min_speed=70&max_age=25.
+    if sort is not None and sort not in player_search.SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort. Choose one of: {', '.join(player_search.SORT_FIELDS)}")
+    ranges = {}
+    for field in player_search.RANGE_FIELDS:
+        bounds = [request.query_params.get(f"{bound}_{field}") for bound in ("min", "max")]
+        if bounds == [None, None]:
+            continue
+        try:
+            ranges[field] = tuple(int(value) if value is not None else None for value in bounds)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Range bounds for {field} must be integers")
+    limit = max(1, min(limit, player_search.MAX_LIMIT))
+    offset = max(0, offset)
+
+    def build():
+        return encode_json(player_search.search_players(db, Player, q, country, position, ranges, sort, limit, offset))
+    return cache.cached_response(request, ("players",), build)
 
 @app.post("/team/{team_id}/player/{player_id}")
 def update_player_team(
@@ -158,6 +262,7 @@ def update_player_team(
         raise HTTPException(status_code=400, detail="Invalid action")
 
     db.commit()
+    cache.invalidate("players")
     return {"message": message}
 
 # ----------------------------------------------------------------------
@@ -178,16 +283,18 @@ def create_team_for_current_user(
     db.add(new_team)
     db.commit()
     db.refresh(new_team)
+    cache.invalidate("teams")
     return new_team
 
 @app.get("/teams/{league_id}", response_model=List[TeamCreate])
-def get_teams(league_id, db: Session = Depends(get_db), token: str = Depends(get_token)):
+def get_teams(league_id, request: Request, db: Session = Depends(get_db), token: str = Depends(get_token)):
     if not token:
         raise HTTPException(status_code=401, detail="Token not provided")
     get_current_admin_user(db, token)
 
-    teams = db.query(DBTeam).filter(DBTeam.league_id == league_id).all()
-    return teams
+    def build():
+        return dump_rows(db, TeamCreate, DBTeam, DBTeam.league_id == league_id)
+    return cache.cached_response(request, ("teams",), build)
 
 @app.get("/my_teams", response_model=TeamCreate)
 def get_my_teams(db: Session = Depends(get_db), token: str = Depends(get_token)):
@@ -199,16 +306,17 @@ def get_my_teams(db: Session = Depends(get_db), token: str = Depends(get_token))
     return teams
 
 @app.get("/team/{team_id}/players", response_model=List[Player])
-def get_team_players(team_id: int, db: Session = Depends(get_db), token: str = Depends(get_token)):
+def get_team_players(team_id: int, request: Request, db: Session = Depends(get_db), token: str = Depends(get_token)):
     if not token:
         raise HTTPException(status_code=401, detail="Token not provided")
 
-    team = db.query(DBTeam).filter(DBTeam.id == team_id).first()
-    if not team:
-        raise HTTPException(status_code=404, detail="Team not found")
+    def build():
+        team = db.query(DBTeam).filter(DBTeam.id == team_id).first()
+        if not team:
+            raise HTTPException(status_code=404, detail="Team not found")
 
-    players = db.query(DBPlayer).filter(DBPlayer.team_id == team_id).all()
-    return players
+        return dump_rows(db, Player, DBPlayer, DBPlayer.team_id == team_id)
+    return cache.cached_response(request, ("players", "teams"), build)
 
 # def assign_auto_teams
 # get or create id 1 of league.
@@ -240,48 +348,156 @@ def assign_auto_teams(
         raise HTTPException(status_code=401, detail="Token not provided")
     get_current_admin_user(db, token)
 
-    league = db.query(DBLeague).filter(DBLeague.id == league_id).first()
-    if not league:
-        league = DBLeague(name="test")
-        db.add(league)
-        db.commit()
-
-    team_1 = db.query(DBTeam).filter(DBTeam.id == team_id_1).first()
-    if not team_1:
-        team_1 = DBTeam(name="team1", owner_id=1, league_id=league_id)
-        db.add(team_1)
-        db.commit()
+    with admission.HEAVY_JOBS.admit():
+        league = db.query(DBLeague).filter(DBLeague.id == league_id).first()
+        if not league:
+            league = DBLeague(name="test")
+            db.add(league)
+            db.commit()
+
+        team_1 = db.query(DBTeam).filter(DBTeam.id == team_id_1).first()
+        if not team_1:
+            team_1 = DBTeam(name="team1", owner_id=1, league_id=league_id)
+            db.add(team_1)
+            db.commit()
     
-    team_2 = db.query(DBTeam).filter(DBTeam.id == team_id_2).first()
-    if not team_2:
-        team_2 = DBTeam(name="team2", owner_id=1, league_id=league_id)
-        db.add(team_2)
-        db.commit()
-
-    def assign_players_to_team(db: Session, team_id: int, missing_starters: dict):
-        current_depths = {position: db.query(DBPlayer).filter(DBPlayer.team_id == team_id, DBPlayer.current_position == position).count() + 1 for position in missing_starters.keys()}
-        for position, count in missing_starters.items():
-            players = gen_players(count, db)  # Generate players for each missing position
-            for _ in range(count):
-                player = players.pop()
-                player.team_id = team_id
-                player.current_position = position  # Assign the correct position
-                player.depth = current_depths[position]  # Set the depth
-                current_depths[position] += 1  # Increment the depth counter
-        db.commit()
-
-    if not check_all_positions_filled(db, team_id_1):
-        missing_starters = get_missing_starters(db, team_id_1)
-        assign_players_to_team(db, team_id_1, missing_starters)
-
-    if not check_all_positions_filled(db, team_id_2):
-        missing_starters = get_missing_starters(db, team_id_2)
-        assign_players_to_team(db, team_id_2, missing_starters)
-
-    return {
-        "team_1": get_team_lineup(db, team_id_1, "starters"),
-        "team_2": get_team_lineup(db, team_id_2, "starters")
-    }
+        team_2 = db.query(DBTeam).filter(DBTeam.id == team_id_2).first()
+        if not team_2:
+            team_2 = DBTeam(name="team2", owner_id=1, league_id=league_id)
+            db.add(team_2)
+            db.commit()
+
+        def assign_players_to_team(db: Session, team_id: int, missing_starters: dict):
+            current_depths = {position: db.query(DBPlayer).filter(DBPlayer.team_id == team_id, DBPlayer.current_position == position).count() + 1 for position in missing_starters.keys()}
+            for position, count in missing_starters.items():
+                players = gen_players(count, db)  # Generate players for each missing position
+                for _ in range(count):
+                    player = players.pop()
+                    player.team_id = team_id
+                    player.current_position = position  # Assign the correct position
+                    player.depth = current_depths[position]  # Set the depth
+                    current_depths[position] += 1  # Increment the depth counter
+            db.commit()
+
+        if not check_all_positions_filled(db, team_id_1):
+            missing_starters = get_missing_starters(db, team_id_1)
+            assign_players_to_team(db, team_id_1, missing_starters)
+
+        if not check_all_positions_filled(db, team_id_2):
+            missing_starters = get_missing_starters(db, team_id_2)
+            assign_players_to_team(db, team_id_2, missing_starters)
+
+        cache.invalidate("players", "teams")
+
+        return {
+            "team_1": get_team_lineup(db, team_id_1, "starters"),
+            "team_2": get_team_lineup(db, team_id_2, "starters")
+        }
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: int, db: Session = Depends(get_db), token: str = Depends(get_token)):
+    if not token:
+        raise HTTPException(status_code=401, detail="Token not provided")
+    get_current_admin_user(db, token)
+    return admission.get_job(job_id)
+
+# ----------------------------------------------------------------------
+# Profiling
+
+@app.post("/profiles")
+def start_profile(
+    game_id: Optional[int] = None, route: Optional[str] = None, mode: str = "deterministic",
+    limit: Optional[int] = None, seconds: float = profiling.DEFAULT_SECONDS,
+    db: Session = Depends(get_db), token: str = Depends(get_token)
+):
+    # Profiles one game's ticks or one route's requests on this worker, for
+    # `limit` ticks or requests or `seconds`, whichever ends first.
+    if not token:
+        raise HTTPException(status_code=401, detail="Token not provided")
+    get_current_admin_user(db, token)
+    if (game_id is None) == (route is None):
+        raise HTTPException(status_code=400, detail="Give either game_id or route")
+
+    if game_id is not None:
+        return profiling.start_game_profile(game_id, mode, limit, seconds)
+    return profiling.start_route_profile(app, route, mode, limit, seconds)
+
+@app.get("/profiles")
+def get_profiles(db: Session = Depends(get_db), token: str = Depends(get_token)):
+    if not token:
+        raise HTTPException(status_code=401, detail="Token not provided")
+    get_current_admin_user(db, token)
+
+    return profiling.list_profiles()
+
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: int, db: Session = Depends(get_db), token: str = Depends(get_token)):
+    if not token:
+        raise HTTPException(status_code=401, detail="Token not provided")
+    get_current_admin_user(db, token)
+
+    return profiling.get_profile(profile_id).describe()
+
+@app.post("/profiles/{profile_id}/stop")
+def stop_profile(profile_id: int, db: Session = Depends(get_db), token: str = Depends(get_token)):
+    if not token:
+        raise HTTPException(status_code=401, detail="Token not provided")
+    get_current_admin_user(db, token)
+
+    profile = profiling.get_profile(profile_id)
+    profile.finish("stopped")
+    return profile.describe()
+
+@app.get("/profiles/{profile_id}/download")
+def download_profile(profile_id: int, db: Session = Depends(get_db), token: str = Depends(get_token)):
+    # pstats for deterministic profiles, collapsed stacks for sampling ones.
+    if not token:
+        raise HTTPException(status_code=401, detail="Token not provided")
+    get_current_admin_user(db, token)
+
+    filename, content = profiling.get_profile(profile_id).dump()
+    return Response(content, media_type="application/octet-stream", headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# ----------------------------------------------------------------------
+# Bulk import/export
+
+@app.get("/export/{entity}")
+def export_entity(entity: str, format: str = "csv", db: Session = Depends(get_db), token: str = Depends(get_token)):
+    if not token:
+        raise HTTPException(status_code=401, detail="Token not provided")
+    get_current_admin_user(db, token)
+    bulk.get_entity(entity)
+    bulk.check_format(format)
+
+    def stream():
+        # The stream outlives the request's session, so it keeps its own.
+        export_db = SessionLocal()
+        try:
+            yield from bulk.export_rows(export_db, entity, format)
+        finally:
+            export_db.close()
+
+    headers = {"Content-Disposition": f'attachment; filename="{entity}.{format}"'}
+    return StreamingResponse(stream(), media_type=bulk.MEDIA_TYPES[format], headers=headers)
+
+@app.post("/import/{entity}")
+def import_entity(
+    entity: str,
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    db: Session = Depends(get_db),
+    token: str = Depends(get_token)
+):
+    if not token:
+        raise HTTPException(status_code=401, detail="Token not provided")
+    get_current_admin_user(db, token)
+
+    with admission.HEAVY_JOBS.admit():
+        try:
+            result = bulk.import_rows(db, entity, format or bulk.format_from_filename(file.filename), file.file)
+        finally:
+            cache.invalidate(*bulk.IMPORT_CACHE_NAMESPACES)
+    return result
 
 @app.get("/test_team_performance")
 def test_team_performance(db: Session = Depends(get_db), token: str = Depends(get_token)):
@@ -295,98 +511,143 @@ def test_team_performance(db: Session = Depends(get_db), token: str = Depends(ge
     result = handle_team_performance(db, new_game.id)
     return result
 
-@app.websocket("/game/{game_id}")
-async def websocket_endpoint(websocket: WebSocket, game_id: int, db: Session = Depends(get_db)):
+@app.get("/game/{game_id}/replay")
+def get_game_replay(game_id: int, ticks: Optional[int] = None, db: Session = Depends(get_db), token: str = Depends(get_token)):
+    if not token:
+        raise HTTPException(status_code=401, detail="Token not provided")
+
+    return replay_game(db, game_id, ticks)
+
+@app.get("/game/{game_id}/timeline")
+def get_game_timeline(game_id: int, db: Session = Depends(get_db), token: str = Depends(get_token)):
+    if not token:
+        raise HTTPException(status_code=401, detail="Token not provided")
+
+    return log_compaction.game_timeline(db, game_id)
+
+async def send_frame(websocket: WebSocket, data: dict):
+    payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    await send_payload(websocket, data.get("type", "message"), payload)
+
+async def send_payload(websocket: WebSocket, message_type: str, payload: str):
+    metrics.record_frame(message_type, payload)
+    await websocket.send_text(payload)
+
+async def watch_disconnect(websocket: WebSocket, subscription: live_games.Subscription):
+    # Clients only send again to resume on a new connection, so anything
+    # received here is ignored; the point is to notice disconnects promptly.
     try:
-        current_game = None
-        increment = 1
-        total_time = 5
-        if game_id is None:
-            await websocket.accept()
-            await websocket.send_json({"message": "Game ID not provided"})
+        while True:
+            await websocket.receive_text()
+    except Exception:
+        pass
+    finally:
+        subscription.close()
+
+async def relay_from_owner(websocket: WebSocket, lease: leases.LeaseHeld, message: dict):
+    # Another node is simulating this game: pass its frames through, or tell
+    # the client when to retry if the owner can't be reached from here.
+    import websockets
+
+    upstream = None
+    if lease.owner_url:
+        try:
+            upstream = await websockets.connect(f"{lease.owner_url}/game/{lease.game_id}", max_size=None)
+        except (OSError, websockets.InvalidHandshake) as e:
+            # Usually an owner that just died; its lease runs out shortly.
+            logger.warning("Can't reach %s for game %s: %s", lease.owner, lease.game_id, e)
+    if upstream is None:
+        await send_frame(websocket, {"type": "game_elsewhere", "message": "Game is running on another server", "retry_after": lease.retry_after})
+        await websocket.close(code=1013)
+        return
+
+    logger.debug("Relaying game %s from %s", lease.game_id, lease.owner)
+    async with upstream:
+        await upstream.send(json.dumps(message))
+        watcher = asyncio.create_task(websocket.receive_text())
+        receiving = asyncio.create_task(upstream.recv())
+        try:
+            while True:
+                done, _ = await asyncio.wait({receiving, watcher}, return_when=asyncio.FIRST_COMPLETED)
+                if watcher in done:
+                    if isinstance(watcher.exception(), WebSocketDisconnect):
+                        break
+                    # The owner already has the join message; anything else
+                    # the client sends while relayed is ignored.
+                    watcher = asyncio.create_task(websocket.receive_text())
+                if receiving in done:
+                    await send_payload(websocket, "relay", receiving.result())
+                    receiving = asyncio.create_task(upstream.recv())
+        except websockets.ConnectionClosedOK:
             await websocket.close()
-            return
+        except websockets.ConnectionClosed:
+            # The owner went away; the client resumes and lands on whichever
+            # node takes the game over.
+            await websocket.close(code=1013)
+        finally:
+            watcher.cancel()
+            receiving.cancel()
+
+@app.websocket("/game/{game_id}")
+async def websocket_endpoint(websocket: WebSocket, game_id: int):
+    # Messages: {"type": "start_game"} joins (or starts) the game;
+    # {"type": "resume", "last_seq": n} rejoins and receives only the frames
+    # after n, or the latest snapshot and the frames since when n is too old.
+    metrics.OPEN_WEBSOCKETS.inc()
+    live_game = None
+    subscription = None
+    watcher = None
+    try:
         await websocket.accept()
 
-        game_started = False
-        game_time = 0
-        while True:
-            if not game_started:
-                data = await websocket.receive_text()
-                data = json.loads(data)
-                print(data)
-                if data['type'] == "start_game":
-                    current_game = db.query(DBGame).filter(DBGame.id == game_id).first()
-                    if not current_game:
-                        current_game = DBGame(id=game_id, season_id=1, home_team_id=1, away_team_id=2, status="scheduled")
-                        db.add(current_game)
-                        db.commit()
-                        current_game = db.query(DBGame).filter(DBGame.id == game_id).first()
-
-                    print(f"Game started: {current_game.id}")
-                    game_started = True
-                    await websocket.send_json({"message": f"Game started"})
+        while subscription is None:
+            data = await websocket.receive_text()
+            data = json.loads(data)
+            logger.debug("Game %s received %s", game_id, data)
+            if data.get('type') in ("start_game", "resume"):
+                last_seq = data.get("last_seq")
+                if last_seq is not None and (type(last_seq) is not int or last_seq < 0):
+                    await send_frame(websocket, {"type": "error", "message": "last_seq must be a non-negative integer"})
+                    continue
+                try:
+                    live_game = live_games.get_or_start_game(game_id)
+                except leases.LeaseHeld as e:
+                    await relay_from_owner(websocket, e, data)
+                    return
+                except HTTPException as e:
+                    if e.status_code != 503:
+                        raise
+                    await send_frame(websocket, {"type": "busy", "message": e.detail, "retry_after": int(e.headers["Retry-After"])})
+                    await websocket.close(code=1013)
+                    return
+                subscription = live_game.subscribe(last_seq)
+                if data["type"] == "resume":
+                    await send_frame(websocket, {"type": "game_resumed", "message": "Game resumed", "last_seq": last_seq})
                 else:
-                    await websocket.send_json({"message": f"Message text was: {data}"})
+                    await send_frame(websocket, {"type": "game_started", "message": "Game started"})
             else:
-                if game_time == total_time / increment:
-                    await websocket.send_json({"type": "game_over",  "message": "Game over"})
-                    break
-
-                # get the most recent game log
-                if game_time == 0:
-                    last_log = None
-                    db.query(DBGIL).filter(DBGIL.game_id == current_game.id).delete()
-                else:
-                    last_log = db.query(DBGIL).filter(DBGIL.game_id == current_game.id).order_by(DBGIL.order.desc()).first()
-                game_time += increment
-
-                handle_snitch_placement(db, current_game.id)
-                catch_result = handle_snitch_catch(db, current_game.id)
-
-                home_score = last_log.home_score if last_log else 0
-                away_score = last_log.away_score if last_log else 0
-
-                if catch_result == "HOME":
-                    home_score += 35
-                elif catch_result == "AWAY":
-                    away_score += 35
-
-                new_log = DBGIL(
-                    game_id=current_game.id,
-                    order=game_time / increment,
-                    home_score=home_score,
-                    away_score=away_score
-                )
-                db.add(new_log)
-                db.commit()
-
-                data = {
-                    "type": "game_state_update",
-                    "message":
-                        {
-                            "score": {
-                                "team_1": home_score,
-                                "team_2": away_score
-                            },
-                            "settings": {
-                                "total_time": total_time,
-                                "interval": increment,
-                                "current_time": game_time,
-                                "matrix_size": { "x": 13, "y": 8, "z": 8 },
-                                "spacing": 1.0,
-                                "speed": 0.1,
-                                "team_1_color": 0xff0000,
-                                "team_2_color": 0x0000ff
-                            },
-                            "team_1": handle_player_movement(db, 1, current_game.id),
-                            "team_2": handle_player_movement(db, 2, current_game.id)
-                        }
-                }
-                await websocket.send_json(data)
-                await asyncio.sleep(1)
+                await send_frame(websocket, {"message": f"Message text was: {data}"})
+
+        watcher = asyncio.create_task(watch_disconnect(websocket, subscription))
+        while True:
+            frame = await subscription.next_frame()
+            if frame is None:
+                if subscription.dropped:
+                    # Fell too far behind; the client reconnects with resume.
+                    await websocket.close(code=1013)
+                break
+            seq, message_type, payload, final = frame
+            await send_payload(websocket, message_type, payload)
+            if final:
+                break
     except WebSocketDisconnect:
-        print("Client disconnected")
+        logger.debug("Client disconnected from game %s", game_id)
     except Exception as e:
-        print(f"Error: {e}")
-        await websocket.close()
\ No newline at end of file
+        logger.exception("Error in game %s: %s", game_id, e)
+        await websocket.close()
+    finally:
+        if watcher:
+            watcher.cancel()
+        if live_game and subscription:
+            live_game.unsubscribe(subscription)
+        metrics.OPEN_WEBSOCKETS.dec()
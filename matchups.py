@@ -0,0 +1,104 @@
+import threading
+
+# ----------------------------------------------------------------------
+# Matchup compiler: at game start both starting lineups are reduced to small
+# coefficient tables so per-tick resolution is array arithmetic plus random
+# draws, never ORM attribute access.
+#
+# Ticks draw each beater's performance from the tables with the game's numpy
+# stream, which snapshots persist alongside the random.Random one. Scoring
+# is unchanged: the draws feed player stats only, and the random.Random
+# stream that drives the snitch and movement is never touched, so replays
+# of earlier games still match. The chaser-vs-keeper terms are compiled
+# for goal scoring, which ticks don't do yet.
+#
+# numpy is imported on first use so importing this module (and the registry
+# helpers main.py needs) stays free at boot.
+
+BEATER_ATTRIBUTES = ("strength", "skill", "speed")
+BEATER_MOD_LOW = (0.3, 0.1, 0.1)
+BEATER_MOD_HIGH = (0.65, 0.45, 0.25)
+
+CHASER_ATTRIBUTES = ("speed", "skill", "teamwork")
+CHASER_ATTACK_WEIGHTS = (0.35, 0.45, 0.2)
+
+KEEPER_ATTRIBUTES = ("strength", "skill", "awareness")
+KEEPER_SAVE_WEIGHTS = (0.3, 0.4, 0.3)
+
+POSITIONS = ("Seeker", "Keeper", "Beater", "Chaser")
+
+_lock = threading.Lock()
+_matchups = {}
+
+# ----------------------------------------------------------------------
+
+def _np():
+    import numpy
+    return numpy
+
+def attribute_matrix(players: list, attributes: tuple):
+    np = _np()
+    matrix = np.zeros((len(players), len(attributes)))
+    for row, player in enumerate(players):
+        for column, attribute in enumerate(attributes):
+            matrix[row, column] = getattr(player, attribute) or 0
+    return matrix
+
+def compile_side(starters: dict) -> dict:
+    np = _np()
+    beaters = attribute_matrix(starters["Beater"], BEATER_ATTRIBUTES)
+    chasers = attribute_matrix(starters["Chaser"], CHASER_ATTRIBUTES)
+    keepers = attribute_matrix(starters["Keeper"], KEEPER_ATTRIBUTES)
+    return {
+        "beater_ids": [player.id for player in starters["Beater"]],
+        "beaters": beaters,
+        "beater_expected": beaters @ ((np.array(BEATER_MOD_LOW) + np.array(BEATER_MOD_HIGH)) / 2),
+        "chaser_attack": chasers @ np.array(CHASER_ATTACK_WEIGHTS),
+        "keeper_save": float((keepers @ np.array(KEEPER_SAVE_WEIGHTS)).sum()) if len(keepers) else 0.0,
+        "skill": {position: sum(player.skill or 0 for player in starters[position]) for position in POSITIONS},
+    }
+
+def compile_matchup(home_starters: dict, away_starters: dict) -> dict:
+    home = compile_side(home_starters)
+    away = compile_side(away_starters)
+    return {
+        "home": home,
+        "away": away,
+        "skill_diff": {position: home["skill"][position] - away["skill"][position] for position in POSITIONS},
+        # Attack of each chaser against the opposing keeper.
+        "chaser_vs_keeper": {
+            "home": home["chaser_attack"] - away["keeper_save"],
+            "away": away["chaser_attack"] - home["keeper_save"],
+        },
+        # Expected edge of each home beater over each away beater.
+        "beater_vs_beater": home["beater_expected"][:, None] - away["beater_expected"][None, :],
+    }
+
+# ----------------------------------------------------------------------
+# Per-tick resolution
+
+def draw_beater_performance(beaters, rng=None):
+    # beaters: rows of BEATER_ATTRIBUTES. One draw per attribute per beater
+    # from a numpy Generator; returns each beater's performance.
+    if rng is None:
+        rng = _np().random.default_rng()
+    return (beaters * rng.uniform(BEATER_MOD_LOW, BEATER_MOD_HIGH, size=beaters.shape)).sum(axis=1)
+
+def get_beater_performance(matchup: dict, rng) -> dict:
+    # side -> this tick's performance of each beater, in beater_ids order.
+    return {side: draw_beater_performance(matchup[side]["beaters"], rng) for side in ("home", "away")}
+
+# ----------------------------------------------------------------------
+# Per-game registry
+
+def set_game_matchup(game_id: int, matchup: dict):
+    with _lock:
+        _matchups[game_id] = matchup
+
+def get_game_matchup(game_id: int):
+    with _lock:
+        return _matchups.get(game_id)
+
+def release_game_matchup(game_id: int):
+    with _lock:
+        _matchups.pop(game_id, None)
@@ -0,0 +1,209 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import threading
+import time
+
+# ----------------------------------------------------------------------
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_lock = threading.Lock()
+_registry = []
+
+# The SQL scope is a mutable dict so queries issued from threadpool workers
+# (sync FastAPI routes) are still attributed to the request that spawned them.
+_sql_scope: ContextVar = ContextVar("sql_scope", default=None)
+# Set while a profiler wants the statements themselves (see profiling.py).
+_sql_capture: ContextVar = ContextVar("sql_capture", default=None)
+
+# ----------------------------------------------------------------------
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, *label_values):
+        with _lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = []
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, *label_values):
+        self.inc(-amount, *label_values)
+
+    def set(self, value: float, *label_values):
+        with _lock:
+            self.values[label_values] = value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.values = {}
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        with _lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self) -> list:
+        lines = []
+        for label_values, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                labels = _format_labels(self.label_names, label_values, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+# ----------------------------------------------------------------------
+# Metric definitions
+
+REQUEST_LATENCY = Histogram(
+    "qg2_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+TICK_PHASE_SECONDS = Histogram(
+    "qg2_game_tick_phase_seconds", "Simulation time per game tick, split by phase.", ("phase",))
+TICK_SECONDS = Histogram(
+    "qg2_game_tick_seconds", "Total simulation time per game tick.")
+SQL_QUERIES = Counter(
+    "qg2_sql_queries_total", "SQL statements executed, by scope.", ("scope",))
+SQL_QUERY_SECONDS = Counter(
+    "qg2_sql_query_seconds_total", "Time spent executing SQL statements, by scope.", ("scope",))
+SQL_QUERIES_PER_UNIT = Histogram(
+    "qg2_sql_queries_per_unit", "SQL statements issued per request or tick.", ("scope",), QUERY_COUNT_BUCKETS)
+SQL_SECONDS_PER_UNIT = Histogram(
+    "qg2_sql_seconds_per_unit", "SQL time spent per request or tick.", ("scope",))
+ACTIVE_GAMES = Gauge(
+    "qg2_active_games", "Games currently being simulated.")
+OPEN_WEBSOCKETS = Gauge(
+    "qg2_open_websockets", "Websocket connections currently open.")
+FRAME_BYTES = Counter(
+    "qg2_websocket_frame_bytes_total", "Bytes sent in outbound websocket frames, by message type.", ("type",))
+FRAMES = Counter(
+    "qg2_websocket_frames_total", "Outbound websocket frames, by message type.", ("type",))
+
+# ----------------------------------------------------------------------
+
+def render_metrics() -> str:
+    lines = []
+    with _lock:
+        for metric in _registry:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+@contextmanager
+def sql_scope(scope: str):
+    stats = {"name": scope, "count": 0, "seconds": 0.0}
+    token = _sql_scope.set(stats)
+    try:
+        yield stats
+    finally:
+        _sql_scope.reset(token)
+        SQL_QUERIES_PER_UNIT.observe(stats["count"], scope)
+        SQL_SECONDS_PER_UNIT.observe(stats["seconds"], scope)
+
+@contextmanager
+def capture_statements(statements: dict):
+    # Collects statement -> [count, seconds] for queries issued in this context.
+    token = _sql_capture.set(statements)
+    try:
+        yield statements
+    finally:
+        _sql_capture.reset(token)
+
+@contextmanager
+def tick_phase(phase: str):
+    with TICK_PHASE_SECONDS.time(phase):
+        yield
+
+def record_frame(message_type: str, payload: str):
+    FRAMES.inc(1, message_type)
+    FRAME_BYTES.inc(len(payload.encode("utf-8")), message_type)
+
+# ----------------------------------------------------------------------
+# SQLAlchemy hooks
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = _sql_scope.get()
+    scope = "other"
+    if stats is not None:
+        stats["count"] += 1
+        stats["seconds"] += elapsed
+        scope = stats["name"]
+    SQL_QUERIES.inc(1, scope)
+    SQL_QUERY_SECONDS.inc(elapsed, scope)
+    statements = _sql_capture.get()
+    if statements is not None:
+        entry = statements.setdefault(statement, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+def instrument_engine(engine: Engine):
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
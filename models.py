@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, String, LargeBinary, ForeignKey, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -68,9 +68,13 @@ class Game(Base):
     bludger_1 = relationship("Bludger", foreign_keys=[bludger_1_id], backref="game_as_bludger_1")
     bludger_2_id = Column(Integer, ForeignKey("bludgers.id", ondelete="CASCADE"))
     bludger_2 = relationship("Bludger", foreign_keys=[bludger_2_id], backref="game_as_bludger_2")
+    seed = Column(Integer, nullable=True)
+    lineup = Column(String, nullable=True)  # JSON of starter ids by side and position
+    finished_at = Column(DateTime, nullable=True)
 
 class GameIntervalLog(Base):
     __tablename__ = "game_interval_logs"
+    __table_args__ = (Index("ix_game_interval_logs_game_order", "game_id", "order"),)
 
     id = Column(Integer, primary_key=True, index=True)
     game_id = Column(Integer, ForeignKey("games.id", ondelete="CASCADE"))
@@ -78,6 +82,100 @@ class GameIntervalLog(Base):
     order = Column(Integer)
     home_score = Column(Integer, default=0)
     away_score = Column(Integer, default=0)
+    home_snitch_catches = Column(Integer, nullable=True, default=0)
+    away_snitch_catches = Column(Integer, nullable=True, default=0)
+
+class GameSnapshot(Base):
+    __tablename__ = "game_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    game_id = Column(Integer, ForeignKey("games.id", ondelete="CASCADE"), unique=True, index=True)
+    seq = Column(Integer)
+    state = Column(String)  # JSON: score, clock, snitch and starter positions
+    rng_state = Column(String)  # JSON of rng.dump_rng_state()
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class CacheVersion(Base):
+    # Response cache namespace versions shared by every worker (see cache.py).
+    __tablename__ = "cache_versions"
+
+    namespace = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
+
+class GameSummary(Base):
+    # Written when a game goes final; the game's interval logs are deleted
+    # once the retention window has passed (see log_compaction.py).
+    __tablename__ = "game_summaries"
+
+    game_id = Column(Integer, ForeignKey("games.id", ondelete="CASCADE"), primary_key=True)
+    ticks = Column(Integer, default=0)
+    home_score = Column(Integer, default=0)
+    away_score = Column(Integer, default=0)
+    home_snitch_catches = Column(Integer, default=0)
+    away_snitch_catches = Column(Integer, default=0)
+    timeline = Column(LargeBinary)  # zlib-packed per-tick scores
+    compacted_at = Column(DateTime, default=datetime.utcnow, index=True)
+    logs_purged_at = Column(DateTime, nullable=True)
+
+class GameLease(Base):
+    __tablename__ = "game_leases"
+
+    game_id = Column(Integer, ForeignKey("games.id", ondelete="CASCADE"), primary_key=True)
+    owner = Column(String)  # node id of the process simulating the game
+    owner_url = Column(String, nullable=True)  # websocket base URL other nodes relay from
+    epoch = Column(Integer, default=1)  # bumped on every takeover; fences stale owners
+    heartbeat_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime)
+
+class TeamStanding(Base):
+    __tablename__ = "team_standings"
+    __table_args__ = (UniqueConstraint("season_id", "team_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    season_id = Column(Integer, index=True)
+    league_id = Column(Integer, ForeignKey("leagues.id", ondelete="CASCADE"), index=True)
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="CASCADE"))
+    team = relationship("Team")
+    games_played = Column(Integer, default=0)
+    wins = Column(Integer, default=0)
+    losses = Column(Integer, default=0)
+    draws = Column(Integer, default=0)
+    points_for = Column(Integer, default=0)
+    points_against = Column(Integer, default=0)
+    snitch_catches = Column(Integer, default=0)
+    streak = Column(Integer, default=0)  # +n for n straight wins, -n for n straight losses
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class PlayerGameStats(Base):
+    __tablename__ = "player_game_stats"
+    __table_args__ = (UniqueConstraint("game_id", "player_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    game_id = Column(Integer, ForeignKey("games.id", ondelete="CASCADE"), index=True)
+    player_id = Column(Integer, ForeignKey("players.id", ondelete="CASCADE"), index=True)
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="CASCADE"))
+    season_id = Column(Integer, index=True)
+    ticks_played = Column(Integer, default=0)
+    distance_covered = Column(Float, default=0)
+    snitch_catches = Column(Integer, default=0)
+    seconds_near_snitch = Column(Float, default=0)
+    beater_performance = Column(Float, default=0)
+
+class PlayerSeasonStats(Base):
+    __tablename__ = "player_season_stats"
+    __table_args__ = (UniqueConstraint("season_id", "player_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    season_id = Column(Integer, index=True)
+    player_id = Column(Integer, ForeignKey("players.id", ondelete="CASCADE"), index=True)
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="CASCADE"))  # team of the latest game
+    games_played = Column(Integer, default=0)
+    ticks_played = Column(Integer, default=0)
+    distance_covered = Column(Float, default=0)
+    snitch_catches = Column(Integer, default=0)
+    seconds_near_snitch = Column(Float, default=0)
+    beater_performance = Column(Float, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
 
 class Team(Base):
     __tablename__ = "teams"
@@ -99,16 +197,16 @@ class Player(Base):
     first_name = Column(String)
     last_name = Column(String)
     country = Column(String)
-    age = Column(Integer)
+    age = Column(Integer, index=True)
     years_pro = Column(Integer)
-    toughness = Column(Integer)
-    awareness = Column(Integer)
-    teamwork = Column(Integer)
-    speed = Column(Integer)
-    strength = Column(Integer)
-    skill = Column(Integer)
+    toughness = Column(Integer, index=True)
+    awareness = Column(Integer, index=True)
+    teamwork = Column(Integer, index=True)
+    speed = Column(Integer, index=True)
+    strength = Column(Integer, index=True)
+    skill = Column(Integer, index=True)
     injury = Column(Integer)
-    primary_position = Column(String)
+    primary_position = Column(String, index=True)
     current_position = Column(String)
     depth = Column(Integer, nullable=True, default=0)
     team_id = Column(Integer, ForeignKey("teams.id"), nullable=True)
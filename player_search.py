@@ -0,0 +1,108 @@
+from fastapi import HTTPException
+from sqlalchemy import column, select, table, text
+from sqlalchemy.orm import Session
+from models import Player as DBPlayer
+from serializers import schema_columns
+import re
+
+# ----------------------------------------------------------------------
+# Player search. Names and country are indexed in an FTS5 table that reads
+# its text from `players` (external content), kept in sync by triggers on
+# insert, delete and name/country updates, so every write path (ORM, the
+# generators, bulk import) is covered without any code of its own. Ticks
+# update player locations only and never touch the index.
+#
+# Words in a query match by prefix ("smi" finds Smith) and results are
+# ranked by bm25 with names weighted over country. Attribute ranges apply to
+# the indexed columns in RANGE_FIELDS.
+
+RANGE_FIELDS = ("age", "toughness", "awareness", "teamwork", "speed", "strength", "skill")
+SORT_FIELDS = ("rank", "id") + RANGE_FIELDS
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# bm25 weights for first_name, last_name, country.
+RANK_WEIGHTS = (4.0, 4.0, 1.0)
+
+SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS players_fts USING fts5(
+        first_name, last_name, country,
+        content='players', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS players_fts_insert AFTER INSERT ON players BEGIN
+        INSERT INTO players_fts(rowid, first_name, last_name, country)
+        VALUES (new.id, new.first_name, new.last_name, new.country);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS players_fts_delete AFTER DELETE ON players BEGIN
+        INSERT INTO players_fts(players_fts, rowid, first_name, last_name, country)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.country);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS players_fts_update AFTER UPDATE OF first_name, last_name, country ON players BEGIN
+        INSERT INTO players_fts(players_fts, rowid, first_name, last_name, country)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.country);
+        INSERT INTO players_fts(rowid, first_name, last_name, country)
+        VALUES (new.id, new.first_name, new.last_name, new.country);
+    END""",
+)
+
+players_fts = table("players_fts", column("rowid"), column("rank"))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# ----------------------------------------------------------------------
+
+def create_search_index(conn):
+    # Creates the index and its triggers if missing, and fills it from the
+    # players already in the database.
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'players_fts'")).first()
+    for statement in SEARCH_DDL:
+        conn.execute(text(statement))
+    if not exists:
+        conn.execute(text("INSERT INTO players_fts(players_fts) VALUES ('rebuild')"))
+        weights = ", ".join(str(weight) for weight in RANK_WEIGHTS)
+        conn.execute(text(f"INSERT INTO players_fts(players_fts, rank) VALUES ('rank', 'bm25({weights})')"))
+
+def match_expression(query: str = None, country: str = None) -> str:
+    # Every word must match as a prefix; country words only in the country
+    # column. User input never reaches FTS5 query syntax unquoted.
+    parts = [f'"{word}"*' for word in _WORD.findall(query or "")]
+    country_words = _WORD.findall(country or "")
+    if country_words:
+        parts.append(f'country : "{" ".join(country_words)}"*')
+    return " ".join(parts)
+
+def search_players(db: Session, schema, query: str = None, country: str = None, position: str = None,
+                   ranges: dict = None, sort: str = None, limit: int = DEFAULT_LIMIT, offset: int = 0) -> list:
+    # ranges: field -> (minimum, maximum), either bound may be None.
+    fields, columns = schema_columns(schema, DBPlayer)
+    statement = select(*columns).select_from(DBPlayer)
+
+    match = match_expression(query, country)
+    if match:
+        statement = statement.join(players_fts, players_fts.c.rowid == DBPlayer.id).where(
+            text("players_fts MATCH :match").bindparams(match=match)
+        )
+    if position:
+        statement = statement.where(DBPlayer.primary_position == position)
+    for field, (minimum, maximum) in (ranges or {}).items():
+        attribute = getattr(DBPlayer, field)
+        if minimum is not None:
+            statement = statement.where(attribute >= minimum)
+        if maximum is not None:
+            statement = statement.where(attribute <= maximum)
+
+    if sort is None:
+        sort = "rank" if match else "id"
+    if sort == "rank":
+        if not match:
+            raise HTTPException(status_code=400, detail="Sorting by rank needs a query or country")
+        statement = statement.order_by(players_fts.c.rank, DBPlayer.id)
+    elif sort == "id":
+        statement = statement.order_by(DBPlayer.id)
+    else:
+        statement = statement.order_by(getattr(DBPlayer, sort).desc(), DBPlayer.id)
+
+    rows = db.execute(statement.limit(limit).offset(offset)).all()
+    return [dict(zip(fields, row)) for row in rows]
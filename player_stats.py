@@ -0,0 +1,211 @@
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from models import (
+    Game as DBGame, Player as DBPlayer,
+    PlayerGameStats as DBPlayerGameStats, PlayerSeasonStats as DBPlayerSeasonStats
+)
+from datetime import datetime
+import argparse
+import sys
+import threading
+import cache
+
+# ----------------------------------------------------------------------
+# Usage:
+#   python player_stats.py rebuild               # recompute every season's aggregates
+#   python player_stats.py rebuild --season 3
+#
+# Per-player counters are accumulated in memory while a game runs (no writes
+# per tick), written as one bulk insert when the game is finalized, and
+# folded into the season aggregates with a single upsert in the same
+# transaction. Leaderboards read the aggregates only.
+
+# The seeker is "near the snitch" while it is within catching range.
+SNITCH_NEAR_DISTANCE = 5
+
+# Counter order in memory and in snapshots.
+STAT_FIELDS = ("ticks_played", "distance_covered", "snitch_catches", "seconds_near_snitch", "beater_performance")
+LEADERBOARD_STATS = STAT_FIELDS + ("games_played",)
+
+_lock = threading.Lock()
+_game_stats = {}
+
+# ----------------------------------------------------------------------
+
+class GameStats:
+    def __init__(self, game_id: int, teams: dict):
+        # teams: player id -> team id for every starter.
+        self.game_id = game_id
+        self.teams = teams
+        self.counters = {player_id: [0, 0.0, 0, 0.0, 0.0] for player_id in teams}
+
+    def record_tick(self):
+        for counters in self.counters.values():
+            counters[0] += 1
+
+    def record_beaters(self, player_ids: list, performances: list):
+        # The performance each beater drew this tick.
+        for player_id, performance in zip(player_ids, performances):
+            counters = self.counters.get(player_id)
+            if counters is not None:
+                counters[4] += performance
+
+    def record_movement(self, player_id: int, distance: float):
+        counters = self.counters.get(player_id)
+        if counters is not None:
+            counters[1] += distance
+
+    def record_seeker(self, player_id: int, distance: float, caught: bool, seconds: float):
+        counters = self.counters.get(player_id)
+        if counters is None:
+            return
+        if caught:
+            counters[2] += 1
+        if distance < SNITCH_NEAR_DISTANCE:
+            counters[3] += seconds
+
+    def to_state(self) -> dict:
+        return {str(player_id): counters for player_id, counters in self.counters.items()}
+
+    def load_state(self, state: dict):
+        for player_id, counters in state.items():
+            if int(player_id) in self.counters:
+                self.counters[int(player_id)] = list(counters)
+
+    def rows(self, season_id: int) -> list:
+        return [
+            dict(zip(STAT_FIELDS, counters), game_id=self.game_id, player_id=player_id,
+                 team_id=self.teams[player_id], season_id=season_id)
+            for player_id, counters in self.counters.items()
+        ]
+
+def distance(a, b) -> float:
+    return ((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2) ** 0.5
+
+def build_game_stats(game: DBGame, starters: dict) -> GameStats:
+    # starters: side -> position -> players.
+    teams = {}
+    for side, team_id in (("home", game.home_team_id), ("away", game.away_team_id)):
+        for players in starters[side].values():
+            for player in players:
+                teams[player.id] = team_id
+    return GameStats(game.id, teams)
+
+# ----------------------------------------------------------------------
+# Per-game registry
+
+def set_game_stats(game_id: int, stats: GameStats):
+    with _lock:
+        _game_stats[game_id] = stats
+
+def get_game_stats(game_id: int):
+    with _lock:
+        return _game_stats.get(game_id)
+
+def release_game_stats(game_id: int):
+    with _lock:
+        _game_stats.pop(game_id, None)
+
+# ----------------------------------------------------------------------
+# Persistence
+
+def season_upsert():
+    statement = insert(DBPlayerSeasonStats)
+    updates = {field: getattr(DBPlayerSeasonStats, field) + getattr(statement.excluded, field) for field in LEADERBOARD_STATS}
+    updates["team_id"] = statement.excluded.team_id
+    updates["updated_at"] = statement.excluded.updated_at
+    return statement.on_conflict_do_update(index_elements=["season_id", "player_id"], set_=updates)
+
+def flush_game_stats(db: Session, game: DBGame) -> int:
+    # Writes the finished game's counters and adds them to the season
+    # aggregates. Does not commit; called from the transaction that
+    # finalizes the game.
+    stats = get_game_stats(game.id)
+    if stats is None or not stats.counters:
+        return 0
+    rows = stats.rows(game.season_id)
+    db.execute(insert(DBPlayerGameStats), rows)
+    now = datetime.utcnow()
+    db.execute(season_upsert(), [
+        {key: value for key, value in row.items() if key != "game_id"} | {"games_played": 1, "updated_at": now}
+        for row in rows
+    ])
+    return len(rows)
+
+def rebuild_season_stats(db: Session, season_id: int = None) -> int:
+    # Recomputes the aggregates from the per-game rows. Returns the number of
+    # player seasons written.
+    aggregates = db.query(DBPlayerSeasonStats)
+    totals = db.query(
+        DBPlayerGameStats.season_id, DBPlayerGameStats.player_id,
+        func.count().label("games_played"),
+        *[func.sum(getattr(DBPlayerGameStats, field)).label(field) for field in STAT_FIELDS]
+    ).group_by(DBPlayerGameStats.season_id, DBPlayerGameStats.player_id)
+    appearances = db.query(DBPlayerGameStats.season_id, DBPlayerGameStats.player_id, DBPlayerGameStats.team_id)
+    if season_id is not None:
+        aggregates = aggregates.filter(DBPlayerSeasonStats.season_id == season_id)
+        totals = totals.filter(DBPlayerGameStats.season_id == season_id)
+        appearances = appearances.filter(DBPlayerGameStats.season_id == season_id)
+    aggregates.delete(synchronize_session=False)
+
+    # Players are listed under the team of their latest game in the season.
+    teams = {(row.season_id, row.player_id): row.team_id for row in appearances.order_by(DBPlayerGameStats.game_id)}
+    now = datetime.utcnow()
+    rows = [
+        dict(row._mapping, team_id=teams[(row.season_id, row.player_id)], updated_at=now)
+        for row in totals
+    ]
+    if rows:
+        db.execute(insert(DBPlayerSeasonStats), rows)
+    db.commit()
+    cache.invalidate("player_stats")
+    return len(rows)
+
+def get_season_leaders(db: Session, season_id: int, stat: str, limit: int = 10) -> list:
+    column = getattr(DBPlayerSeasonStats, stat)
+    rows = db.query(
+        DBPlayerSeasonStats.player_id, DBPlayer.first_name, DBPlayer.last_name,
+        DBPlayerSeasonStats.team_id, DBPlayerSeasonStats.games_played, column.label("value")
+    ).join(DBPlayer, DBPlayer.id == DBPlayerSeasonStats.player_id).filter(
+        DBPlayerSeasonStats.season_id == season_id
+    ).order_by(column.desc(), DBPlayerSeasonStats.player_id).limit(limit).all()
+    return [
+        {
+            "rank": rank,
+            "player_id": row.player_id,
+            "first_name": row.first_name,
+            "last_name": row.last_name,
+            "team_id": row.team_id,
+            "games_played": row.games_played,
+            "stat": stat,
+            "value": row.value,
+        }
+        for rank, row in enumerate(rows, start=1)
+    ]
+
+# ----------------------------------------------------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain per-player season aggregates.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild = subparsers.add_parser("rebuild", help="Recompute season aggregates from per-game stats")
+    rebuild.add_argument("--season", type=int, help="Only rebuild this season")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    import database
+    database.create_db_and_tables()
+    db = database.SessionLocal()
+    try:
+        if args.command == "rebuild":
+            count = rebuild_season_stats(db, args.season)
+            scope = f"season {args.season}" if args.season is not None else "all seasons"
+            print(f"rebuilt {count} player season aggregates for {scope}")
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+from collections import Counter, OrderedDict
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+from datetime import datetime
+import cProfile
+import functools
+import inspect
+import itertools
+import marshal
+import pstats
+import sys
+import threading
+import time
+import metrics
+
+# ----------------------------------------------------------------------
+# On-demand profiling, per worker process, started by admins through
+# /profiles.
+#
+# A profile targets one game's tick loop or one route and runs until it has
+# seen `limit` ticks or requests, or for `seconds`, whichever comes first.
+# "deterministic" runs every profiled call under cProfile and downloads as a
+# pstats file (python -m pstats, snakeviz, flameprof); "sampling" walks the
+# stacks of the threads inside profiled calls every SAMPLE_INTERVAL and
+# downloads as collapsed stacks for flamegraph.pl or speedscope. Either way
+# the SQL statements issued are counted and timed.
+#
+# With nothing being profiled, the tick loop pays one dict lookup and routes
+# pay nothing: a route's endpoint is only wrapped while its profile runs.
+
+MODES = ("deterministic", "sampling")
+
+DEFAULT_SECONDS = 60
+MAX_SECONDS = 600
+SAMPLE_INTERVAL = 0.005
+PROFILES_KEPT = 20
+TOP_FUNCTIONS = 25
+TOP_STATEMENTS = 25
+
+_lock = threading.Lock()
+_profiles = OrderedDict()
+_profile_ids = itertools.count(1)
+_game_profiles = {}  # game id -> Profile
+_route_profiles = {}  # route path -> Profile
+
+# ----------------------------------------------------------------------
+
+class Profile:
+    def __init__(self, profile_id: int, target: str, name, mode: str, limit: int, seconds: float):
+        self.id = profile_id
+        self.target = target  # "game" or "route"
+        self.name = name  # game id or route path
+        self.mode = mode
+        self.limit = limit
+        self.deadline = time.monotonic() + seconds
+        self.status = "running"
+        self.calls = 0
+        self.call_seconds = 0.0
+        self.started_at = datetime.utcnow()
+        self.finished_at = None
+        self.stats = None  # pstats.Stats, deterministic mode
+        self.samples = Counter()  # collapsed stack -> samples, sampling mode
+        self.statements = {}  # SQL -> [count, seconds]
+        self.threads = set()  # ids of threads inside a profiled call
+        self.on_finish = []
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        if self.status == "running" and time.monotonic() >= self.deadline:
+            self.finish()
+        return self.status == "running"
+
+    def run(self, func, *args, **kwargs):
+        if not self.running:
+            return func(*args, **kwargs)
+        statements = {}
+        profiler = cProfile.Profile() if self.mode == "deterministic" else None
+        thread_id = threading.get_ident()
+        start = time.perf_counter()
+        try:
+            with metrics.capture_statements(statements):
+                if profiler is not None:
+                    return profiler.runcall(func, *args, **kwargs)
+                with self._lock:
+                    self.threads.add(thread_id)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    with self._lock:
+                        self.threads.discard(thread_id)
+        finally:
+            self._record(profiler, statements, time.perf_counter() - start)
+
+    def _record(self, profiler, statements: dict, elapsed: float):
+        with self._lock:
+            self.calls += 1
+            self.call_seconds += elapsed
+            if profiler is not None:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profiler)
+                else:
+                    self.stats.add(profiler)
+            for statement, (count, seconds) in statements.items():
+                entry = self.statements.setdefault(statement, [0, 0.0])
+                entry[0] += count
+                entry[1] += seconds
+            done = self.limit is not None and self.calls >= self.limit
+        if done:
+            self.finish()
+
+    def sample(self):
+        # Runs on its own thread for sampling profiles.
+        while self.running:
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id in self.threads:
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        self.samples[collapse_stack(frame)] += 1
+            del frames
+            time.sleep(SAMPLE_INTERVAL)
+
+    def finish(self, status: str = "done"):
+        with self._lock:
+            if self.status != "running":
+                return
+            self.status = status
+            self.finished_at = datetime.utcnow()
+            callbacks, self.on_finish = self.on_finish, []
+        for callback in callbacks:
+            callback()
+
+    def describe(self) -> dict:
+        with self._lock:
+            functions = []
+            if self.stats is not None:
+                ranked = sorted(self.stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+                for (filename, line, function), (_, calls, total, cumulative, _) in ranked[:TOP_FUNCTIONS]:
+                    functions.append({
+                        "function": pstats.func_std_string((filename, line, function)),
+                        "calls": calls,
+                        "total_seconds": round(total, 6),
+                        "cumulative_seconds": round(cumulative, 6),
+                    })
+            statements = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+            return {
+                "id": self.id,
+                "target": self.target,
+                "name": self.name,
+                "mode": self.mode,
+                "status": self.status,
+                "calls": self.calls,
+                "limit": self.limit,
+                "call_seconds": round(self.call_seconds, 6),
+                "samples": sum(self.samples.values()),
+                "started_at": self.started_at.isoformat(),
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+                "seconds_left": max(0, round(self.deadline - time.monotonic(), 1)) if self.status == "running" else 0,
+                "top_functions": functions,
+                "sql": [
+                    {"statement": statement, "count": count, "seconds": round(seconds, 6)}
+                    for statement, (count, seconds) in statements[:TOP_STATEMENTS]
+                ],
+            }
+
+    def dump(self) -> tuple:
+        # (filename, bytes) of the result in the mode's download format.
+        with self._lock:
+            if self.mode == "deterministic":
+                if self.stats is None:
+                    raise HTTPException(status_code=409, detail="Nothing was profiled yet")
+                return f"profile-{self.id}.prof", marshal.dumps(self.stats.stats)
+            lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+            return f"profile-{self.id}.folded", ("\n".join(lines) + "\n").encode("utf-8")
+
+def collapse_stack(frame) -> str:
+    # Root first, separated by ';', as flamegraph.pl expects.
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+# ----------------------------------------------------------------------
+
+def game_profile(game_id: int):
+    # The running profile for a game's ticks, if any. Called every tick.
+    return _game_profiles.get(game_id)
+
+def _register(profile: Profile, registry: dict):
+    # The check and the insert happen under _lock. A profile whose time is up
+    # is replaced here but only finished after the lock is released, since
+    # finishing runs callbacks that take _lock themselves.
+    def unregister():
+        with _lock:
+            if registry.get(profile.name) is profile:
+                del registry[profile.name]
+    profile.on_finish.append(unregister)
+
+    with _lock:
+        current = registry.get(profile.name)
+        running = current is not None and current.status == "running"
+        expired = running and time.monotonic() >= current.deadline
+        if running and not expired:
+            raise HTTPException(status_code=409, detail=f"Profile {current.id} is already running for this {profile.target}")
+        registry[profile.name] = profile
+        _profiles[profile.id] = profile
+        while len(_profiles) > PROFILES_KEPT:
+            oldest = next(iter(_profiles.values()))
+            if oldest.status == "running":
+                break
+            _profiles.popitem(last=False)
+    if expired:
+        current.finish()
+
+def _start(profile: Profile):
+    if profile.mode == "sampling":
+        threading.Thread(target=profile.sample, name=f"qg2-profile-{profile.id}", daemon=True).start()
+
+def _new_profile(target: str, name, mode: str, limit: int, seconds: float) -> Profile:
+    if mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode. Choose one of: {', '.join(MODES)}")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    seconds = max(1, min(seconds, MAX_SECONDS))
+    return Profile(next(_profile_ids), target, name, mode, limit, seconds)
+
+def start_game_profile(game_id: int, mode: str, limit: int = None, seconds: float = DEFAULT_SECONDS) -> dict:
+    # Profiles the game's next ticks on this worker; the game may start later.
+    profile = _new_profile("game", game_id, mode, limit, seconds)
+    _register(profile, _game_profiles)
+    _start(profile)
+    return profile.describe()
+
+def start_route_profile(app, path: str, mode: str, limit: int = None, seconds: float = DEFAULT_SECONDS) -> dict:
+    # `path` is a route path ("/players/search") or endpoint name ("search_players").
+    routes = [route for route in app.routes if isinstance(route, APIRoute) and path in (route.path, route.name)]
+    if not routes:
+        raise HTTPException(status_code=404, detail="Route not found")
+    if any(inspect.iscoroutinefunction(route.dependant.call) for route in routes):
+        raise HTTPException(status_code=400, detail="Only sync routes can be profiled")
+
+    profile = _new_profile("route", routes[0].path, mode, limit, seconds)
+    _register(profile, _route_profiles)
+    for route in routes:
+        endpoint = route.dependant.call
+
+        @functools.wraps(endpoint)
+        def profiled(*args, _endpoint=endpoint, **kwargs):
+            return profile.run(_endpoint, *args, **kwargs)
+
+        route.dependant.call = profiled
+        profile.on_finish.append(functools.partial(setattr, route.dependant, "call", endpoint))
+    _start(profile)
+    return profile.describe()
+
+def get_profile(profile_id: int) -> Profile:
+    with _lock:
+        profile = _profiles.get(profile_id)
+    if profile is None:
+        # Profiles are tracked by the worker that started them.
+        raise HTTPException(status_code=404, detail="Profile not found")
+    # Reading `running` finishes a profile whose time is up.
+    profile.running
+    return profile
+
+def list_profiles() -> list:
+    with _lock:
+        profiles = list(_profiles.values())
+    return [get_profile(profile.id).describe() for profile in profiles]
@@ -0,0 +1,67 @@
+import random
+import secrets
+import threading
+
+# ----------------------------------------------------------------------
+
+SEED_BITS = 62  # fits in a signed SQLite INTEGER
+
+_lock = threading.Lock()
+_game_rngs = {}
+
+# ----------------------------------------------------------------------
+
+class GameRNG:
+    # One seeded stream per game. `random` drives the scalar gameplay helpers;
+    # `numpy` is a Generator on the same seed for vectorised paths and is only
+    # built (and numpy only imported) the first time it is asked for. Both
+    # are saved in snapshots.
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.random = random.Random(seed)
+        self._numpy = None
+
+    @property
+    def numpy(self):
+        if self._numpy is None:
+            import numpy as np
+            self._numpy = np.random.default_rng(self.seed)
+        return self._numpy
+
+def new_game_seed() -> int:
+    return secrets.randbits(SEED_BITS)
+
+def get_game_rng(game) -> GameRNG:
+    # Games without a stored seed get one assigned here; the caller commits it
+    # along with the rest of the tick.
+    if game.seed is None:
+        game.seed = new_game_seed()
+    with _lock:
+        game_rng = _game_rngs.get(game.id)
+        if game_rng is None or game_rng.seed != game.seed:
+            game_rng = _game_rngs[game.id] = GameRNG(game.seed)
+        return game_rng
+
+def reset_game_rng(game) -> GameRNG:
+    with _lock:
+        _game_rngs.pop(game.id, None)
+    return get_game_rng(game)
+
+def dump_rng_state(game_rng: GameRNG) -> list:
+    # [version, internal, gauss_next, numpy state or None]; snapshots written
+    # before the numpy stream was saved have only the first three.
+    version, internal, gauss_next = game_rng.random.getstate()
+    numpy_state = game_rng._numpy.bit_generator.state if game_rng._numpy is not None else None
+    return [version, list(internal), gauss_next, numpy_state]
+
+def restore_game_rng(game, state: list) -> GameRNG:
+    game_rng = reset_game_rng(game)
+    version, internal, gauss_next = state[:3]
+    game_rng.random.setstate((version, tuple(internal), gauss_next))
+    if len(state) > 3 and state[3] is not None:
+        game_rng.numpy.bit_generator.state = state[3]
+    return game_rng
+
+def release_game_rng(game_id: int):
+    with _lock:
+        _game_rngs.pop(game_id, None)
@@ -39,6 +39,9 @@ class PlayerBase(BaseModel):
 class PlayerCreate(PlayerBase):
     pass
 
+class PlayerImport(PlayerBase):
+    id: Optional[int] = None
+
 class Player(PlayerBase):
     id: int
 
@@ -53,6 +56,9 @@ class TeamBase(BaseModel):
 class TeamCreate(TeamBase):
     pass
 
+class TeamImport(TeamBase):
+    id: Optional[int] = None
+
 class Team(TeamBase):
     id: int
     players: List[Player] = []
@@ -66,6 +72,9 @@ class LeagueBase(BaseModel):
 class LeagueCreate(LeagueBase):
     pass
 
+class LeagueImport(LeagueBase):
+    id: Optional[int] = None
+
 class League(LeagueBase):
     id: int
     teams: List[Team] = []
@@ -138,10 +147,37 @@ class Game(GameBase):
     class Config:
         from_attributes = True
 
+class TeamStanding(BaseModel):
+    rank: int
+    team_id: int
+    team_name: str
+    season_id: Optional[int] = None
+    games_played: int
+    wins: int
+    losses: int
+    draws: int
+    points_for: int
+    points_against: int
+    points_difference: int
+    snitch_catches: int
+    streak: int
+
+class StatLeader(BaseModel):
+    rank: int
+    player_id: int
+    first_name: str
+    last_name: str
+    team_id: Optional[int] = None
+    games_played: int
+    stat: str
+    value: float
+
 class GameIntervalLogBase(BaseModel):
     order: int
     home_score: int
     away_score: int
+    home_snitch_catches: Optional[int] = 0
+    away_snitch_catches: Optional[int] = 0
 
 class GameIntervalLogCreate(GameIntervalLogBase):
     pass
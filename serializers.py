@@ -0,0 +1,49 @@
+from sqlalchemy import Integer, cast, select
+from sqlalchemy.orm import Session
+from typing import Optional
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# ----------------------------------------------------------------------
+# Fast path for large list responses: select exactly the columns a schema
+# exposes as plain tuples and encode them straight to JSON bytes, instead of
+# loading ORM objects and validating every row through Pydantic.
+#
+# The schema stays the documented contract (and the route's response_model);
+# int fields are cast in SQL so values stored as REAL by the simulation still
+# come out as the ints the schema promises.
+
+_INT_ANNOTATIONS = (int, Optional[int])
+_schema_columns = {}
+
+# ----------------------------------------------------------------------
+
+def encode_json(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+def schema_columns(schema, model) -> tuple:
+    columns = _schema_columns.get((schema, model))
+    if columns is None:
+        fields = tuple(schema.model_fields)
+        selected = []
+        for name, field in schema.model_fields.items():
+            column = getattr(model, name)
+            if field.annotation in _INT_ANNOTATIONS:
+                column = cast(column, Integer)
+            selected.append(column.label(name))
+        columns = _schema_columns[(schema, model)] = (fields, tuple(selected))
+    return columns
+
+def dump_rows(db: Session, schema, model, *criteria) -> bytes:
+    fields, columns = schema_columns(schema, model)
+    statement = select(*columns)
+    if criteria:
+        statement = statement.where(*criteria)
+    rows = db.execute(statement).all()
+    return encode_json([dict(zip(fields, row)) for row in rows])
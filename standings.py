@@ -0,0 +1,185 @@
+from sqlalchemy import case, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from models import (
+    Game as DBGame, GameIntervalLog as DBGIL, GameSummary as DBGameSummary, Team as DBTeam, TeamStanding as DBTeamStanding
+)
+from datetime import datetime
+import argparse
+import sys
+import cache
+
+# ----------------------------------------------------------------------
+# Usage:
+#   python standings.py rebuild               # recompute every season
+#   python standings.py rebuild --season 3    # recompute one season
+#
+# Standings are materialized per team per season and updated in the same
+# transaction that finalizes a game, so reading a league's table is one
+# indexed query over its teams. A result is added with one upsert that
+# increments the counters in SQL, so games finishing at the same time, on
+# any worker, never lose or duplicate an update. `rebuild` replays every final game in the
+# order it finished, for backfills or after fixing a bad result.
+
+# Tie-break order of the table: wins, then points difference, then points for.
+STANDINGS_ORDER = (
+    DBTeamStanding.wins.desc(),
+    (DBTeamStanding.points_for - DBTeamStanding.points_against).desc(),
+    DBTeamStanding.points_for.desc(),
+    DBTeamStanding.team_id,
+)
+
+# Counters a result adds to.
+RESULT_FIELDS = ("games_played", "wins", "losses", "draws", "points_for", "points_against", "snitch_catches")
+
+# ----------------------------------------------------------------------
+
+def standing_upsert():
+    statement = insert(DBTeamStanding)
+    updates = {field: getattr(DBTeamStanding, field) + getattr(statement.excluded, field) for field in RESULT_FIELDS}
+    updates["streak"] = case(
+        (statement.excluded.wins > 0, case((DBTeamStanding.streak > 0, DBTeamStanding.streak + 1), else_=1)),
+        (statement.excluded.losses > 0, case((DBTeamStanding.streak < 0, DBTeamStanding.streak - 1), else_=-1)),
+        else_=0,
+    )
+    updates["league_id"] = statement.excluded.league_id
+    updates["updated_at"] = statement.excluded.updated_at
+    return statement.on_conflict_do_update(index_elements=["season_id", "team_id"], set_=updates)
+
+def result_row(season_id: int, team: DBTeam, points_for: int, points_against: int, snitch_catches: int) -> dict:
+    # One game's contribution to a team's standing; also the row inserted
+    # for a team's first game of the season.
+    won = points_for > points_against
+    lost = points_for < points_against
+    return {
+        "season_id": season_id,
+        "league_id": team.league_id,
+        "team_id": team.id,
+        "games_played": 1,
+        "wins": int(won),
+        "losses": int(lost),
+        "draws": int(not won and not lost),
+        "points_for": points_for,
+        "points_against": points_against,
+        "snitch_catches": snitch_catches,
+        "streak": 1 if won else -1 if lost else 0,
+        "updated_at": datetime.utcnow(),
+    }
+
+def record_game_result(db: Session, game: DBGame, final_log: DBGIL = None):
+    # Adds one finished game to both teams' standings. Does not commit.
+    # `final_log` may also be the game's summary, which has the same scores.
+    if final_log is None:
+        final_log = db.query(DBGIL).filter(DBGIL.game_id == game.id).order_by(DBGIL.order.desc()).first()
+    home_score = final_log.home_score if final_log else 0
+    away_score = final_log.away_score if final_log else 0
+    home_catches = (final_log.home_snitch_catches or 0) if final_log else 0
+    away_catches = (final_log.away_snitch_catches or 0) if final_log else 0
+
+    db.execute(standing_upsert(), [
+        result_row(game.season_id, game.home_team, home_score, away_score, home_catches),
+        result_row(game.season_id, game.away_team, away_score, home_score, away_catches),
+    ])
+
+def finalize_game(db: Session, game: DBGame) -> bool:
+    # Marks a game final and counts it in the standings, in the caller's
+    # transaction. A game is only ever counted once.
+    if game.status == "final":
+        return False
+    record_game_result(db, game)
+    game.status = "final"
+    game.finished_at = datetime.utcnow()
+    return True
+
+def get_league_standings(db: Session, league_id: int, season_id: int = None) -> list:
+    if season_id is None:
+        season_id = db.query(func.max(DBTeamStanding.season_id)).filter(DBTeamStanding.league_id == league_id).scalar()
+        if season_id is None:
+            return []
+    rows = db.query(
+        DBTeamStanding.team_id, DBTeam.name, DBTeamStanding.season_id,
+        DBTeamStanding.games_played, DBTeamStanding.wins, DBTeamStanding.losses, DBTeamStanding.draws,
+        DBTeamStanding.points_for, DBTeamStanding.points_against,
+        DBTeamStanding.snitch_catches, DBTeamStanding.streak
+    ).join(DBTeam, DBTeam.id == DBTeamStanding.team_id).filter(
+        DBTeamStanding.league_id == league_id, DBTeamStanding.season_id == season_id
+    ).order_by(*STANDINGS_ORDER).all()
+    return [
+        {
+            "rank": rank,
+            "team_id": row.team_id,
+            "team_name": row.name,
+            "season_id": row.season_id,
+            "games_played": row.games_played,
+            "wins": row.wins,
+            "losses": row.losses,
+            "draws": row.draws,
+            "points_for": row.points_for,
+            "points_against": row.points_against,
+            "points_difference": row.points_for - row.points_against,
+            "snitch_catches": row.snitch_catches,
+            "streak": row.streak,
+        }
+        for rank, row in enumerate(rows, start=1)
+    ]
+
+def rebuild_standings(db: Session, season_id: int = None) -> int:
+    # Recomputes standings from scratch out of the final games and their
+    # summary, or last interval log if not compacted yet. Returns the number
+    # of games counted.
+    standings = db.query(DBTeamStanding)
+    games = db.query(DBGame).filter(DBGame.status == "final")
+    if season_id is not None:
+        standings = standings.filter(DBTeamStanding.season_id == season_id)
+        games = games.filter(DBGame.season_id == season_id)
+    standings.delete(synchronize_session=False)
+
+    game_ids = games.with_entities(DBGame.id)
+    final_logs = {
+        summary.game_id: summary
+        for summary in db.query(DBGameSummary).filter(DBGameSummary.game_id.in_(game_ids))
+    }
+    last_order = db.query(DBGIL.game_id, func.max(DBGIL.order).label("order")).filter(
+        DBGIL.game_id.in_(game_ids), DBGIL.game_id.not_in(db.query(DBGameSummary.game_id))
+    ).group_by(DBGIL.game_id).subquery()
+    final_logs.update(
+        (log.game_id, log)
+        for log in db.query(DBGIL).join(
+            last_order, (DBGIL.game_id == last_order.c.game_id) & (DBGIL.order == last_order.c.order)
+        )
+    )
+
+    # Streaks depend on order; games finished before finished_at existed go first.
+    count = 0
+    for game in games.order_by(DBGame.finished_at.is_not(None), DBGame.finished_at, DBGame.id):
+        record_game_result(db, game, final_logs.get(game.id))
+        count += 1
+    db.commit()
+    cache.invalidate("standings")
+    return count
+
+# ----------------------------------------------------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain league standings.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild = subparsers.add_parser("rebuild", help="Recompute standings from final games")
+    rebuild.add_argument("--season", type=int, help="Only rebuild this season")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    import database
+    database.create_db_and_tables()
+    db = database.SessionLocal()
+    try:
+        if args.command == "rebuild":
+            count = rebuild_standings(db, args.season)
+            scope = f"season {args.season}" if args.season is not None else "all seasons"
+            print(f"rebuilt standings for {scope} from {count} final games")
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())